@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+#
+# Benchmark of bulk update commands.
+# Copyright (c) 2018-2023, Hiroyuki Ohsaki.
+# All rights reserved.
+#
+
+# Compare the number of updates per second with line-by-line commands and
+# with the equivalent bulk command.  Objects are rendered with the Null
+# monitor so that only the parser cost is measured.
+
+import random
+import time
+
+import cellx
+
+N_OBJECTS = 1000
+N_FRAMES = 20
+
+ROWS = [
+    ('animate', 'p{} v{}'),
+    ('move', 'p{} {:.4f} {:.4f}'),
+    ('color', 'p{} heat{}'),
+]
+
+def setup():
+    cell = cellx.Cell(monitor=cellx.monitor.Null(), rate_limit=0)
+    parser = cellx.Parser(cell=cell)
+    for i in range(N_OBJECTS):
+        parser.parse_line('define v{} ellipse 3 3 yellow {:.4f} {:.4f}'.format(
+            i, random.random(), random.random()))
+        parser.parse_line('define p{} box 10 10 white'.format(i))
+    return parser
+
+def rows(template):
+    lines = []
+    for _ in range(N_FRAMES):
+        for i in range(N_OBJECTS):
+            if template.endswith('v{}'):
+                args = (i, random.randrange(N_OBJECTS))
+            elif template.endswith('heat{}'):
+                args = (i, random.randrange(100))
+            else:
+                args = (i, random.random(), random.random())
+            lines.append(template.format(*args))
+    return lines
+
+def measure(parser, lines):
+    start = time.perf_counter()
+    for line in lines:
+        parser.parse_line(line)
+    return time.perf_counter() - start
+
+def main():
+    for cmd, template in ROWS:
+        lines = rows(template)
+        elapsed = measure(setup(), [cmd + ' ' + line for line in lines])
+        print('{:10} {:12.0f} updates/s'.format(cmd, len(lines) / elapsed))
+        bulk = []
+        for n in range(0, len(lines), N_OBJECTS):
+            bulk += ['bulk ' + cmd] + lines[n:n + N_OBJECTS] + ['end']
+        elapsed = measure(setup(), bulk)
+        print('{:10} {:12.0f} updates/s'.format('bulk ' + cmd,
+                                                len(lines) / elapsed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+#
+# Micro-benchmark of CELL command dispatch.
+# Copyright (c) 2018-2023, Hiroyuki Ohsaki.
+# All rights reserved.
+#
+
+# Measure the number of lines parsed per second for every command.  Objects
+# are rendered with the Null monitor so that only the parser cost is
+# measured.
+
+import time
+
+import cellx
+
+N_OBJECTS = 100
+N_LINES = 20000
+
+STATEMENTS = [
+    ('alpha', 'alpha v{} .5'),
+    ('animate', 'animate v{} .5 .5'),
+    ('attach', 'attach t{} v{} 10 10'),
+    ('color', 'color v{} cyan'),
+    ('define', 'define v{} ellipse 3 3 yellow'),
+    ('display', 'display'),
+    ('fade', 'fade x{}'),
+    ('fix', 'fix v{}'),
+    ('hide', 'hide v{}'),
+    ('kill', 'kill x{}'),
+    ('move', 'move v{} .2 .3'),
+    ('priority', 'priority v{} 2'),
+    ('resize', 'resize v{} 10 10'),
+    ('shift', 'shift v{} 1 1'),
+    ('unhide', 'unhide v{}'),
+    ('wait', 'wait'),
+]
+
+def setup():
+    cell = cellx.Cell(monitor=cellx.monitor.Null(), rate_limit=0)
+    parser = cellx.Parser(cell=cell)
+    for i in range(N_OBJECTS):
+        parser.parse_line('define v{} ellipse 3 3 yellow'.format(i))
+        parser.parse_line('define t{} text t 10 white'.format(i))
+    return cell, parser
+
+def main():
+    for cmd, template in STATEMENTS:
+        cell, parser = setup()
+        lines = []
+        for n in range(N_LINES):
+            i = n % N_OBJECTS
+            if cmd in ('fade', 'kill'):
+                # Every line consumes a fresh object.
+                i = n
+                parser.parse_line('define x{} box'.format(i))
+            lines.append(template.format(i, i))
+        start = time.perf_counter()
+        for line in lines:
+            parser.parse_line(line)
+        elapsed = time.perf_counter() - start
+        print('{:10} {:12.0f} lines/s'.format(cmd, len(lines) / elapsed))
+
+if __name__ == "__main__":
+    main()
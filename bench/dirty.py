@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+#
+# Benchmark of dirty-rectangle rendering.
+# Copyright (c) 2018-2023, Hiroyuki Ohsaki.
+# All rights reserved.
+#
+
+# Measure the frame rate of the SDL monitor for sparse animation on a
+# full-screen window: a fixed network with a few packets moving over it.
+# Frames are rendered with and without dirty-rectangle tracking.  Run with
+# SDL_VIDEODRIVER=dummy when no display is available.
+
+import random
+import time
+
+import cellx
+import cellx.monitor.sdl
+
+WIDTH, HEIGHT = 1920, 1080
+N_NODES = 300
+N_PACKETS = 3
+N_ROUNDS = 10
+
+def script():
+    random.seed(1)
+    lines = []
+    for i in range(N_NODES):
+        lines.append('define n{} ellipse 15 15 yellow {:.3f} {:.3f}'.format(
+            i, random.random(), random.random()))
+    for i in range(1, N_NODES):
+        lines.append('define l{} link n{} n{} 2 gray50'.format(
+            i, i, random.randrange(i)))
+    lines.append('fix /^[nl]/')
+    for k in range(N_ROUNDS):
+        for p in range(N_PACKETS):
+            lines.append('define p{}_{} box 8 8 orange {:.3f} {:.3f}'.format(
+                k, p, random.random(), random.random()))
+            lines.append('animate p{}_{} {:.3f} {:.3f}'.format(
+                k, p, random.random(), random.random()))
+        lines.append('display')
+    return lines
+
+def measure(lines, area_limit):
+    cellx.monitor.sdl.DIRTY_AREA_LIMIT = area_limit
+    monitor = cellx.monitor.SDL(width=WIDTH, height=HEIGHT, alpha=255)
+    cell = cellx.Cell(width=WIDTH,
+                      height=HEIGHT,
+                      monitor=monitor,
+                      rate_limit=0)
+    parser = cellx.Parser(cell=cell)
+    start = time.perf_counter()
+    for line in lines:
+        parser.parse_line(line)
+    return cell.frame_count / (time.perf_counter() - start)
+
+def main():
+    lines = script()
+    print('{:16} {:10.1f} fps'.format('full redraw', measure(lines, -1)))
+    print('{:16} {:10.1f} fps'.format('dirty rectangles', measure(lines, .5)))
+
+if __name__ == "__main__":
+    main()
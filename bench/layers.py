@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+#
+# Benchmark of cached render layers.
+# Copyright (c) 2018-2023, Hiroyuki Ohsaki.
+# All rights reserved.
+#
+
+# Measure the frame rate of the SDL monitor for a large network with load
+# indicators on some nodes, whose colors change every few frames while
+# packets move over it.  Frames are rendered without caching, with all
+# objects fixed in a single layer, and with indicators in a separate layer
+# above the network.  Run with SDL_VIDEODRIVER=dummy when no display is
+# available.
+
+import random
+import time
+
+import cellx
+import cellx.monitor.sdl
+
+WIDTH, HEIGHT = 1920, 1080
+N_NODES = 3000
+N_PACKETS = 5
+N_INDICATORS = 200
+N_FRAMES = 60
+# Indicator colors are updated every this many frames.
+RECOLOR_INTERVAL = 10
+
+def script(layered):
+    random.seed(1)
+    lines = []
+    for i in range(N_NODES):
+        lines.append('define n{} ellipse 9 9 yellow {:.3f} {:.3f}'.format(
+            i, random.random(), random.random()))
+    for i in range(1, N_NODES):
+        lines.append('define l{} link n{} n{} 2 gray50'.format(
+            i, i, random.randrange(i)))
+    for i in range(N_INDICATORS):
+        lines.append('define b{} box 12 4 green n{}+0-8'.format(i, i))
+    lines.append('fix /^[nlb]/')
+    if layered:
+        lines.append('layer heat /^b/')
+    for i in range(N_PACKETS):
+        lines.append('define p{} box 8 8 orange {:.3f} {:.3f}'.format(
+            i, random.random(), random.random()))
+    for k in range(N_FRAMES):
+        for i in range(N_PACKETS):
+            lines.append('move p{} {:.3f} {:.3f}'.format(
+                i, random.random(), random.random()))
+        if k % RECOLOR_INTERVAL == 0:
+            color = random.choice(['red', 'green', 'blue'])
+            for i in random.sample(range(N_INDICATORS), 10):
+                lines.append('color b{} {}'.format(i, color))
+        lines.append('display')
+    return lines
+
+def measure(lines, cached):
+    cellx.monitor.sdl.DIRTY_AREA_LIMIT = .5 if cached else -1
+    monitor = cellx.monitor.SDL(width=WIDTH, height=HEIGHT, alpha=255)
+    cell = cellx.Cell(width=WIDTH,
+                      height=HEIGHT,
+                      monitor=monitor,
+                      rate_limit=0)
+    parser = cellx.Parser(cell=cell)
+    if not cached:
+        lines = [line for line in lines if not line.startswith('fix')]
+    start = None
+    for line in lines:
+        # Exclude the first frame, which draws everything in any case.
+        if start is None and cell.frame_count:
+            start = time.perf_counter()
+        parser.parse_line(line)
+    return (cell.frame_count - 1) / (time.perf_counter() - start)
+
+def main():
+    print('{:16} {:10.1f} fps'.format('no cache', measure(script(False),
+                                                           False)))
+    print('{:16} {:10.1f} fps'.format('single layer',
+                                      measure(script(False), True)))
+    print('{:16} {:10.1f} fps'.format('heat layer',
+                                      measure(script(True), True)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+#
+# Benchmark of batched line rendering of the SDL monitor.
+# Copyright (c) 2018-2023, Hiroyuki Ohsaki.
+# All rights reserved.
+#
+
+# Compare the number of links drawn per second one by one with two
+# triangles per segment and in a batch by the SDL monitor.  Links connect
+# nearby nodes of a large topology.  Run with SDL_VIDEODRIVER=dummy when no
+# display is available.
+
+import math
+import random
+import time
+
+import pygame
+import pygame.gfxdraw
+
+import cellx
+
+WIDTH, HEIGHT = 1920, 1080
+N_NODES = 20000
+N_LINKS = 50000
+N_FRAMES = 5
+# The maximum distance between nodes connected by a link.
+MAX_LENGTH = 40
+
+def objects():
+    random.seed(1)
+    nodes = [
+        cellx.Object(type='ellipse',
+                     x=random.random() * WIDTH,
+                     y=random.random() * HEIGHT) for _ in range(N_NODES)
+    ]
+    objs = []
+    for _ in range(N_LINKS):
+        src = random.choice(nodes)
+        dst = cellx.Object(type='ellipse',
+                           x=src.x + random.uniform(-MAX_LENGTH, MAX_LENGTH),
+                           y=src.y + random.uniform(-MAX_LENGTH, MAX_LENGTH))
+        objs.append(
+            cellx.Object(type='link',
+                         src=src,
+                         dst=dst,
+                         width=random.choice([1, 2, 3]),
+                         color=random.choice(['gray50', 'red', 'green']),
+                         alpha=random.choice([1, .5])))
+    return objs
+
+# Monitor drawing every segment with two triangles.
+class Triangles(cellx.monitor.SDL):
+    def draw_line(self, sx, sy, dx, dy, width, color, alpha):
+        theta = math.atan2(dy - sy, dx - sx)
+        xx = width / 2 * math.cos(math.pi / 2 + theta)
+        yy = width / 2 * math.sin(math.pi / 2 + theta)
+        color = self.palette.rgba(color, alpha)
+        pygame.gfxdraw.filled_trigon(self.screen, int(sx + xx), int(sy + yy),
+                                     int(sx - xx), int(sy - yy), int(dx + xx),
+                                     int(dy + yy), color)
+        pygame.gfxdraw.filled_trigon(self.screen, int(dx + xx), int(dy + yy),
+                                     int(dx - xx), int(dy - yy), int(sx - xx),
+                                     int(sy - yy), color)
+
+    def render_lines(self, objs):
+        for obj in objs:
+            self.render(obj)
+
+def measure(monitor, objs):
+    monitor.screen = monitor.current_frame
+    start = time.perf_counter()
+    for _ in range(N_FRAMES):
+        monitor.render_many(objs)
+    return N_FRAMES * len(objs) / (time.perf_counter() - start)
+
+def main():
+    objs = objects()
+    for name, cls in [('triangles', Triangles),
+                      ('batched', cellx.monitor.SDL)]:
+        monitor = cls(width=WIDTH, height=HEIGHT, alpha=255)
+        print('{:10} {:10.0f} links/s'.format(name, measure(monitor, objs)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+#
+# Memory benchmark of cell object storage.
+# Copyright (c) 2018-2023, Hiroyuki Ohsaki.
+# All rights reserved.
+#
+
+# Compare the number of bytes per object with and without the columnar
+# object store.
+
+import sys
+import tracemalloc
+
+import cellx
+
+def bytes_per_object(n, columnar):
+    tracemalloc.start()
+    cell = cellx.Cell(monitor=cellx.monitor.Null(), columnar=columnar)
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(n):
+        cell.add(
+            cellx.Object(type='ellipse',
+                         name='v{}'.format(i),
+                         x=i,
+                         y=i,
+                         width=6,
+                         height=6,
+                         color='yellow'))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / n
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for columnar in [False, True]:
+        label = 'columnar' if columnar else 'object'
+        print('{:10} {:8.1f} bytes/object'.format(label,
+                                                 bytes_per_object(n, columnar)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+#
+# Benchmark of the macro preprocessor.
+# Copyright (c) 2018-2023, Hiroyuki Ohsaki.
+# All rights reserved.
+#
+
+# Measure the number of lines preprocessed per second by the built-in
+# preprocessor, and by the external cpp command if available.
+
+import shutil
+import subprocess
+import time
+
+import cellx
+
+N_LINES = 100000
+
+HEADER = """\
+#define font_size 20
+#define packet_color gray80
+#define add_note_below(name, str) \\
+define name##_note text str font_size white name+0+40
+#define create_customer_at(name, pos) \\
+  define name box -f black 10 50 packet_color pos
+"""
+
+def script():
+    lines = HEADER.splitlines()
+    for n in range(N_LINES // 2):
+        lines.append('create_customer_at(c{}, .33 .44)'.format(n % 1000))
+        lines.append('add_note_below(c{}, customer)'.format(n % 1000))
+    return lines
+
+def main():
+    lines = script()
+    start = time.perf_counter()
+    pp = cellx.Preprocessor()
+    for line in pp.process(lines):
+        pass
+    elapsed = time.perf_counter() - start
+    print('{:10} {:12.0f} lines/s'.format('builtin', len(lines) / elapsed))
+
+    if shutil.which('cpp'):
+        text = '\n'.join(lines) + '\n'
+        start = time.perf_counter()
+        subprocess.run(['cpp', '-P'],
+                       input=text.encode(),
+                       stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        print('{:10} {:12.0f} lines/s'.format('cpp', len(lines) / elapsed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+#
+# Benchmark of input reading.
+# Copyright (c) 2018-2023, Hiroyuki Ohsaki.
+# All rights reserved.
+#
+
+# Measure the bandwidth of reading a trace in MB/s of uncompressed data,
+# for plain and compressed files.  The line-by-line reading with rstrip is
+# also measured for comparison.
+
+import bz2
+import gzip
+import lzma
+import os
+import random
+import tempfile
+import time
+
+import cellx
+
+N_LINES = 1000000
+
+def trace():
+    lines = []
+    for _ in range(N_LINES):
+        lines.append('move p{} {:.3f} {:.3f}\n'.format(random.randrange(1000),
+                                                       random.random() * 800,
+                                                       random.random() * 600))
+    return ''.join(lines).encode()
+
+def measure(label, size, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print('{:16} {:10.1f} MB/s'.format(label, size / elapsed / 1e6))
+
+def main():
+    data = trace()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        files = {'plain': os.path.join(tmpdir, 'trace.scl')}
+        with open(files['plain'], 'wb') as f:
+            f.write(data)
+        for ext, module in [('gz', gzip), ('bz2', bz2), ('xz', lzma)]:
+            files[ext] = os.path.join(tmpdir, 'trace.scl.' + ext)
+            with module.open(files[ext], 'wb') as f:
+                f.write(data)
+
+        def readline():
+            with open(files['plain']) as f:
+                for line in f:
+                    line.rstrip()
+
+        measure('plain (readline)', len(data), readline)
+        for label, file in files.items():
+
+            def read():
+                with cellx.open_input(file) as f:
+                    for line in cellx.LineReader(f):
+                        pass
+
+            measure(label, len(data), read)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+#
+# Benchmark of the sprite cache of the SDL monitor.
+# Copyright (c) 2018-2023, Hiroyuki Ohsaki.
+# All rights reserved.
+#
+
+# Compare the number of shapes drawn per second by 'gfxdraw' functions and
+# by the SDL monitor, which draws cached sprites.  Boxes, ellipses, and
+# polygons share a few colors and sizes.  Run with SDL_VIDEODRIVER=dummy
+# when no display is available.
+
+import random
+import time
+
+import pygame
+import pygame.gfxdraw
+
+import cellx
+
+N_OBJECTS = 5000
+N_FRAMES = 10
+SIZES = [16, 32, 48, 64, 128]
+COLORS = ['red', 'green', 'blue', 'yellow', 'orange']
+
+def objects(size):
+    objs = []
+    for _ in range(N_OBJECTS):
+        objs.append(
+            cellx.Object(type=random.choice(['box', 'ellipse', 'polygon']),
+                         x=random.random() * 800,
+                         y=random.random() * 600,
+                         width=size,
+                         height=size,
+                         n=5,
+                         rotation=0,
+                         color=random.choice(COLORS),
+                         alpha=random.choice([1, .5])))
+    return objs
+
+# Monitor drawing shapes with 'gfxdraw' functions every time.
+class Direct(cellx.monitor.SDL):
+    def _render_box(self, obj):
+        rect = pygame.Rect(obj.x - obj.width / 2, obj.y - obj.height / 2,
+                           obj.width, obj.height)
+        pygame.gfxdraw.box(self.screen, rect,
+                           self.palette.rgba(obj.color, obj.alpha))
+
+    def _render_ellipse(self, obj):
+        pygame.gfxdraw.filled_ellipse(self.screen, int(obj.x), int(obj.y),
+                                      int(obj.width / 2), int(obj.height / 2),
+                                      self.palette.rgba(obj.color, obj.alpha))
+
+    def _render_polygon(self, obj):
+        pygame.gfxdraw.filled_polygon(self.screen, obj.vertices(),
+                                      self.palette.rgba(obj.color, obj.alpha))
+
+def measure(monitor, objs):
+    monitor.screen = monitor.current_frame
+    start = time.perf_counter()
+    for _ in range(N_FRAMES):
+        for obj in objs:
+            monitor.render(obj)
+        monitor.flush_sprites()
+    return N_FRAMES * len(objs) / (time.perf_counter() - start)
+
+def main():
+    direct_monitor = Direct(width=800, height=600, alpha=255)
+    monitor = cellx.monitor.SDL(width=800, height=600, alpha=255)
+    for size in SIZES:
+        objs = objects(size)
+        direct = measure(direct_monitor, objs)
+        cached = measure(monitor, objs)
+        hits, misses = monitor.sprite_hits, monitor.sprite_misses
+        monitor.sprite_hits = monitor.sprite_misses = 0
+        print('size {:3}  gfxdraw {:9.0f}/s  sprites {:9.0f}/s  hit rate {:.3f}'.
+              format(size, direct, cached, hits / max(hits + misses, 1)))
+
+if __name__ == "__main__":
+    main()
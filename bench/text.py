@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+#
+# Benchmark of text rendering of the SDL monitor.
+# Copyright (c) 2018-2023, Hiroyuki Ohsaki.
+# All rights reserved.
+#
+
+# Compare the number of labels prepared per second by rendering every label
+# with the font and by the monitor-wide text cache.  Labels are shared by
+# many objects.  Run with SDL_VIDEODRIVER=dummy when no display is
+# available.
+
+import time
+
+import cellx
+
+N_LINES = 20000
+N_LABELS = 50
+SIZE = 12
+
+def measure(func, lines):
+    start = time.perf_counter()
+    for line in lines:
+        func(line)
+    return len(lines) / (time.perf_counter() - start)
+
+def main():
+    monitor = cellx.monitor.SDL(width=800, height=600, alpha=255)
+    font = monitor.font(SIZE)
+    color = monitor.palette.rgba('white')
+    labels = ['node{}'.format(i % N_LABELS) for i in range(N_LINES)]
+    rendered = measure(lambda line: font.render(line, 1, color), labels)
+    cached = measure(lambda line: monitor.text_line(line, SIZE, color),
+                     labels)
+    print('font.render {:9.0f}/s  cached {:9.0f}/s  hit rate {:.3f}'.format(
+        rendered, cached,
+        monitor.text_hits / (monitor.text_hits + monitor.text_misses)))
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,10 @@
+from .binary import *
 from .cell import *
+from .layout import *
 from .monitor import *
 from .object import *
 from .parser import *
+from .preprocessor import *
+from .reader import *
+from .store import *
 from .util import *
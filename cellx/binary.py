@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+#
+# Compact binary encoding of the cell language.
+# Copyright (c) 2018-2023, Hiroyuki Ohsaki.
+# All rights reserved.
+#
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# A binary stream starts with MAGIC followed by frames.  Every frame is a
+# 16-bit little-endian payload length and the payload.  Payloads longer than
+# 65534 bytes have the length 0xffff followed by the 32-bit length.  The
+# first byte of a payload is the opcode.  Opcodes smaller than OP_INTERN are
+# opcodes of commands in OPCODES, and followed by typed arguments.  Every
+# argument is a type byte and its value:
+#
+#   ARG_NAME16  16-bit id of a string registered with OP_INTERN
+#   ARG_NAME    32-bit id of a string registered with OP_INTERN
+#   ARG_INT8    8-bit signed integer
+#   ARG_INT     32-bit signed integer
+#   ARG_FLOAT   32-bit float
+#   ARG_DOUBLE  64-bit float
+#   ARG_DECIMAL + SCALE
+#               32-bit signed integer M, representing decimal M / 10^SCALE
+#               with SCALE (1 to 9) digits after the decimal point
+#
+# All numbers are little-endian.  Numbers are encoded only if their
+# canonical string forms are the original words, so that every argument is
+# decoded back to the exact string.  Decimals, e.g., coordinates printed with
+# '%.3f', are thus encoded in 5 bytes.  Decoded arguments are converted into
+# numbers by command handlers as in the text form, which takes most of the
+# time of replaying a binary stream; replaying a trace of move commands is
+# about 25% faster than its text form.
+#
+# OP_INTERN registers a string with a 32-bit id.  OP_TEXT carries a
+# statement in the text form, which is used for blocks (e.g., for and bulk)
+# and statements containing variables.
+
+import glob
+import hashlib
+import os
+import re
+import struct
+import tempfile
+
+import numpy
+
+import cellx
+
+MAGIC = b'CELLXB03'
+# Headers of streams readable by the current decoder.
+READABLE_MAGICS = (MAGIC, b'CELLXB02')
+
+OP_INTERN = 0xfe
+OP_TEXT = 0xff
+
+# Opcodes of commands.  Opcodes must never be changed or reused since they
+# are saved in binary streams; new commands are given new opcodes.
+OPCODES = {
+    'alpha': 0,
+    'animate': 1,
+    'attach': 2,
+    'bulk': 3,
+    'color': 4,
+    'define': 5,
+    'display': 6,
+    'end': 7,
+    'fade': 8,
+    'fix': 9,
+    'for': 10,
+    'hide': 11,
+    'kill': 12,
+    'layer': 13,
+    'move': 14,
+    'palette': 15,
+    'play': 16,
+    'priority': 17,
+    'repeat': 18,
+    'resize': 19,
+    'set': 20,
+    'shift': 21,
+    'sleep': 22,
+    'spring': 23,
+    'unhide': 24,
+    'wait': 25,
+}
+
+ARG_NAME = 0
+ARG_INT = 1
+ARG_FLOAT = 2
+ARG_DOUBLE = 3
+ARG_NAME16 = 4
+ARG_INT8 = 5
+ARG_DECIMAL = 0x10
+
+LONG_FRAME = 0xffff
+
+UINT16 = struct.Struct('<H')
+UINT32 = struct.Struct('<I')
+INT32 = struct.Struct('<i')
+FLOAT = struct.Struct('<f')
+DOUBLE = struct.Struct('<d')
+
+INT_REGEXP = re.compile(r'[+-]?\d+$')
+FLOAT_REGEXP = re.compile(r'[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$')
+DECIMAL_REGEXP = re.compile(r'-?(0|[1-9]\d*)\.(\d{1,9})$')
+
+# Directory of compiled scripts, which is created next to scripts.
+CACHE_DIR = '__cellxcache__'
+
+# Commands always sent in the text form.
+TEXT_COMMANDS = ('for', 'repeat', 'bulk', 'end', 'set')
+
+class Encoder:
+    def __init__(self, stream, float32=False):
+        """Create an encoder writing frames to binary stream STREAM.
+        Floating-point numbers are encoded in 32 bits if FLOAT32 is True;
+        otherwise, in 64 bits."""
+        self.stream = stream
+        self.float32 = float32
+        self.names = {}
+        # Parser for resolving commands and tracking blocks.
+        self.parser = cellx.Parser()
+        self.opcodes = {
+            getattr(self.parser, '_parse_' + name): opcode
+            for name, opcode in OPCODES.items()
+        }
+        self.text_handlers = [
+            getattr(self.parser, '_parse_' + name) for name in TEXT_COMMANDS
+        ]
+        self.depth = 0
+        self.in_bulk = False
+        stream.write(MAGIC)
+
+    def write_frame(self, opcode, payload=b''):
+        """Write a frame of opcode OPCODE and bytes PAYLOAD."""
+        size = len(payload) + 1
+        if size < LONG_FRAME:
+            header = UINT16.pack(size)
+        else:
+            header = UINT16.pack(LONG_FRAME) + UINT32.pack(size)
+        self.stream.write(header + bytes([opcode]) + payload)
+
+    def intern(self, name):
+        """Return the id of string NAME.  A new id is registered if NAME has
+        not been seen."""
+        id_ = self.names.get(name, None)
+        if id_ is None:
+            id_ = self.names[name] = len(self.names)
+            self.write_frame(OP_INTERN, UINT32.pack(id_) + name.encode())
+        return id_
+
+    def encode_arg(self, word):
+        """Return bytes encoding argument WORD.  WORD is encoded as a number
+        only if it is decoded back to the same string."""
+        if INT_REGEXP.match(word) and str(int(word)) == word:
+            v = int(word)
+            if -128 <= v < 128:
+                return bytes([ARG_INT8, v & 0xff])
+            if -2**31 <= v < 2**31:
+                return bytes([ARG_INT]) + INT32.pack(v)
+        m = DECIMAL_REGEXP.match(word)
+        if m:
+            v = int(word.replace('.', ''))
+            # Negative zeros such as -0.0 are not restored.
+            if -2**31 <= v < 2**31 and (v or word[0] != '-'):
+                return bytes([ARG_DECIMAL + len(m.group(2))]) + INT32.pack(v)
+        if FLOAT_REGEXP.match(word):
+            v = float(word)
+            if self.float32 and str(numpy.float32(v)) == word:
+                return bytes([ARG_FLOAT]) + FLOAT.pack(v)
+            if repr(v) == word:
+                return bytes([ARG_DOUBLE]) + DOUBLE.pack(v)
+        id_ = self.intern(word)
+        if id_ < 0x10000:
+            return bytes([ARG_NAME16]) + UINT16.pack(id_)
+        return bytes([ARG_NAME]) + UINT32.pack(id_)
+
+    def write_statement(self, line):
+        """Encode a single statement LINE."""
+        words = line.split()
+        if not words or words[0].startswith('#'):
+            return
+        if self.depth == 0:
+            handler = self.parser.lookup_prefix(self.parser.command_table,
+                                                words[0].lower())
+            opcode = self.opcodes.get(handler, None)
+            if opcode is not None and handler not in self.text_handlers \
+                and '$' not in line:
+                self.write_frame(
+                    opcode, b''.join(self.encode_arg(w) for w in words[1:]))
+                return
+        # Blocks and unknown commands are kept as text.
+        delta, self.in_bulk = self.parser.block_nesting(line, self.in_bulk)
+        self.depth = max(self.depth + delta, 0)
+        self.write_frame(OP_TEXT, line.encode())
+
+    def write_line(self, line):
+        """Encode a line LINE, which may contain multiple statements separated
+        with semicolons."""
+        for statement in line.split(';'):
+            self.write_statement(statement)
+
+def is_binary(head):
+    """Check if bytes HEAD are the beginning of a binary stream."""
+    return head.startswith(READABLE_MAGICS)
+
+def decimal_string(v, scale):
+    """Return the string of decimal V / 10^SCALE having SCALE digits after
+    the decimal point."""
+    digits = str(abs(v)).rjust(scale + 1, '0')
+    return ('-' if v < 0 else '') + digits[:-scale] + '.' + digits[-scale:]
+
+# Strings of 8-bit signed integers.
+INT8_STRINGS = [str(v - 256 if v > 127 else v) for v in range(256)]
+
+def read_frames(stream, head=None):
+    """Read frames from binary stream STREAM, and return the generator of
+    statements.  A statement is either a pair of the opcode and the list of
+    string arguments, or a pair of OP_TEXT and a string.  HEAD is the bytes
+    at the beginning of the stream if they have already been read."""
+    if head is None:
+        head = stream.read(len(MAGIC))
+    if head not in READABLE_MAGICS:
+        raise ValueError('not a binary cell stream')
+    names = []
+    while True:
+        header = stream.read(2)
+        if len(header) < 2:
+            return
+        size, = UINT16.unpack(header)
+        if size == LONG_FRAME:
+            size, = UINT32.unpack(stream.read(4))
+        payload = stream.read(size)
+        if len(payload) < size:
+            raise ValueError('truncated frame')
+        opcode = payload[0]
+        if opcode == OP_TEXT:
+            yield opcode, payload[1:].decode()
+            continue
+        if opcode == OP_INTERN:
+            names.append(payload[5:].decode())
+            continue
+        args = []
+        i = 1
+        while i < size:
+            atype = payload[i]
+            if atype == ARG_NAME16:
+                args.append(names[UINT16.unpack_from(payload, i + 1)[0]])
+                i += 3
+            elif atype == ARG_INT8:
+                args.append(INT8_STRINGS[payload[i + 1]])
+                i += 2
+            elif atype == ARG_NAME:
+                args.append(names[UINT32.unpack_from(payload, i + 1)[0]])
+                i += 5
+            elif atype == ARG_INT:
+                args.append(str(INT32.unpack_from(payload, i + 1)[0]))
+                i += 5
+            elif atype == ARG_DOUBLE:
+                args.append(repr(DOUBLE.unpack_from(payload, i + 1)[0]))
+                i += 9
+            elif ARG_DECIMAL < atype < ARG_DECIMAL + 10:
+                args.append(
+                    decimal_string(INT32.unpack_from(payload, i + 1)[0],
+                                   atype - ARG_DECIMAL))
+                i += 5
+            elif atype == ARG_FLOAT:
+                args.append(
+                    str(numpy.float32(FLOAT.unpack_from(payload, i + 1)[0])))
+                i += 5
+            else:
+                raise ValueError('unknown argument type {}'.format(atype))
+        yield opcode, args
+
+def run_binary(parser, stream, head=None):
+    """Execute all statements read from binary stream STREAM with parser
+    PARSER.  HEAD is the bytes at the beginning of the stream if they have
+    already been read."""
+    handlers = {
+        opcode: getattr(parser, '_parse_' + name)
+        for name, opcode in OPCODES.items()
+    }
+    for opcode, args in read_frames(stream, head):
+        if opcode == OP_TEXT:
+            parser.parse_line(args)
+        elif opcode in handlers:
+            parser.execute(handlers[opcode], args)
+        else:
+            raise ValueError('unknown opcode {}'.format(opcode))
+
+def script_digest(file):
+    """Return the hash string identifying the current version of script
+    FILE.  Like Python bytecode caches, the hash is computed from the size
+    and the modification time of FILE so that FILE is not read.  The hash
+    also depends on the binary format and the opcodes, so that compiled
+    scripts are invalidated when they change."""
+    st = os.stat(file)
+    key = repr((OPCODES, st.st_size, st.st_mtime_ns))
+    return hashlib.sha256(MAGIC + key.encode()).hexdigest()
+
+def compiled_path(file, digest):
+    """Return the path of the compiled form of script FILE having hash
+    DIGEST."""
+    return os.path.join(os.path.dirname(file), CACHE_DIR, '{}.{}.bin'.format(
+        os.path.basename(file), digest[:16]))
+
+def compile_script(file):
+    """Compile script FILE into the binary form unless already compiled, and
+    return the path of the compiled script.  Compiled scripts are saved in
+    CACHE_DIR next to FILE, and keyed by the hash of FILE.  FILE must be a
+    regular file."""
+    path = compiled_path(file, script_digest(file))
+    if os.path.exists(path):
+        return path
+    cache_dir = os.path.dirname(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file first so that other processes never read a
+    # partially-written script.
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out, cellx.open_input(file) as f:
+            encoder = Encoder(out)
+            for line in cellx.LineReader(f):
+                encoder.write_line(line)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    # Remove outdated compiled scripts.
+    for old in glob.glob(compiled_path(file, '*')):
+        if old != path:
+            os.remove(old)
+    return path
@@ -18,28 +18,109 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-import math
+import bisect
+import collections
+import hashlib
+import json
 import os
 import re
 import tempfile
 import time
 
+import numpy
+
 import cellx
 from perlcompat import die
 
+# The number of iterations of the incremental layout per display.
+LAYOUT_ITERATIONS = 5
+
+# The maximum number of layouts memoized in memory.
+MAX_MEMOIZED_LAYOUTS = 64
+
+# The maximum number of regular expressions whose matches are memoized.
+MAX_MEMOIZED_REGEXPS = 64
+
+def literal_prefix(regexp):
+    """Return the literal prefix that every string matching anchored regular
+    expression REGEXP must start with.  An empty string is returned if REGEXP
+    is not anchored or has no literal prefix."""
+    if not regexp.startswith('^') or '|' in regexp:
+        return ''
+    prefix = ''
+    i = 1
+    while i < len(regexp):
+        c = regexp[i]
+        if c.isalnum() or c == '_':
+            prefix += c
+            i += 1
+        elif c == '\\' and i + 1 < len(regexp) and not regexp[i + 1].isalnum():
+            prefix += regexp[i + 1]
+            i += 2
+        else:
+            break
+    # The last character is optional if followed by a quantifier.
+    if prefix and i < len(regexp) and regexp[i] in '?*{':
+        prefix = prefix[:-1]
+    return prefix
+
 class Cell:
     def __init__(self,
                  width=800,
                  height=600,
                  monitor=None,
                  frame_rate=30,
-                 rate_limit=30):
+                 rate_limit=30,
+                 columnar=False,
+                 layout_cache_dir=None):
         self.width = width
         self.height = height
         self.monitor = monitor
         self.frame_rate = frame_rate
         self.rate_limit = rate_limit
         self.objects = {}
+        # Optional columnar storage of objects.
+        self.store = cellx.ObjectStore() if columnar else None
+        # Incremented whenever the set of object names changes.
+        self.generation = 0
+        # Sorted index of object names for prefix searches.  Newly added
+        # names are merged lazily, and deleted names are removed lazily.
+        self.name_index = []
+        self.unindexed_names = []
+        self.stale_names = set()
+        # Sequence numbers of object names in the order of registration.
+        self.name_seq = {}
+        self.next_seq = 0
+        # Memoized regular expression matches: regexp -> (pattern, names).
+        self.regexp_matches = collections.OrderedDict()
+        # Members of object groups: group -> {name: True}.
+        self.groups = {}
+        # Objects being animated and faded, respectively.  These are
+        # dictionaries used as ordered sets.
+        self.moving = {}
+        self.fading = {}
+        # Links incident to objects: name -> {link: True}.
+        self.incident_links = {}
+        # Incremental layout for 'spring -i', and the endpoints of links
+        # added or deleted since the last 'spring -i'.
+        self.layout = None
+        self.link_log = []
+        # Memoized results of 'spring': key -> positions.  Results are also
+        # saved in LAYOUT_CACHE_DIR if specified.
+        self.layout_cache = collections.OrderedDict()
+        self.layout_cache_dir = layout_cache_dir
+        self.layout_cache_hits = 0
+        self.layout_cache_misses = 0
+        # Visible objects bucketed by priority: priority -> {obj: True}.
+        self.render_buckets = {}
+        # Sorted list of priorities having any visible objects.
+        self.render_priorities = []
+        # Priorities whose buckets are not in the order of definition.
+        self.unsorted_priorities = set()
+        # Priorities at the time objects were put into the buckets.
+        self.render_priority = {}
+        # Visible objects in the order of rendering, or None if outdated.
+        self.render_cache = None
         self.palette = {}
         self.frame_count = 0
         self.time_started = time.time()
@@ -60,15 +141,316 @@ class Cell:
     def add(self, obj):
         """Register cell object OBJ.  If the cell object the same name already
         exists, it is overwritten; i.e., the older object is simply
-        discarded."""
-        self.objects[obj.name] = obj
+        discarded.  The registered object is returned, which is a view of
+        OBJ if the columnar store is enabled."""
+        if self.store and getattr(obj, '_store', None) is not self.store:
+            obj = self.store.adopt(obj)
+        name = obj.name
+        old = self.objects.get(name, None)
+        if old:
+            self._ungroup(old)
+            self.moving.pop(old, None)
+            self.fading.pop(old, None)
+            self._delist(old)
+            if old.type_ == 'link':
+                self._unlink(old)
+            if self.store:
+                self.store.release(old)
+        for group in obj.groups:
+            self.groups.setdefault(group, {})[name] = True
+        if not old:
+            self.name_seq[name] = self.next_seq
+            self.next_seq += 1
+        self._enlist(obj)
+        if obj.velocity:
+            self.moving[obj] = True
+        if obj.fade_out:
+            self.fading[obj] = True
+        if obj.type_ == 'link':
+            self._link(obj)
+        # Links to the discarded object are reconnected to OBJ.
+        for link in self.incident_links.get(name, ()):
+            if link.src is old:
+                link.src = obj
+            if link.dst is old:
+                link.dst = obj
+        if not old:
+            self.generation += 1
+            if name in self.stale_names:
+                self.stale_names.remove(name)
+            else:
+                self.unindexed_names.append(name)
+            for pattern, matches in self.regexp_matches.values():
+                if pattern.search(name):
+                    matches[name] = True
+        self.objects[name] = obj
+        return obj
+
+    def add_many(self, objs):
+        """Register all cell objects in OBJS, and return the list of
+        registered objects.  This is equivalent to calling add for every
+        object, but indices of object names are updated at once."""
+        registered = []
+        added = []
+        for obj in objs:
+            name = obj.name
+            # Overwriting objects and links need extra bookkeeping.
+            if name in self.objects or obj.type_ == 'link':
+                registered.append(self.add(obj))
+                continue
+            if self.store:
+                obj = self.store.adopt(obj)
+            for group in obj.groups:
+                self.groups.setdefault(group, {})[name] = True
+            self.name_seq[name] = self.next_seq
+            self.next_seq += 1
+            self._enlist(obj)
+            if obj.velocity:
+                self.moving[obj] = True
+            if obj.fade_out:
+                self.fading[obj] = True
+            self.objects[name] = obj
+            added.append(name)
+            registered.append(obj)
+        if added:
+            self.generation += 1
+            for name in added:
+                if name in self.stale_names:
+                    self.stale_names.remove(name)
+                else:
+                    self.unindexed_names.append(name)
+            for pattern, matches in self.regexp_matches.values():
+                for name in filter(pattern.search, added):
+                    matches[name] = True
+        return registered
 
     def delete(self, name):
         """Unregister cell object having name NAME."""
         try:
-            del self.objects[name]
+            obj = self.objects.pop(name)
         except KeyError:
             die("delete: cannot delete non-existing object '{}'".format(name))
+        self._ungroup(obj)
+        self.moving.pop(obj, None)
+        self.fading.pop(obj, None)
+        self._delist(obj)
+        if obj.type_ == 'link':
+            self._unlink(obj)
+        if self.store:
+            self.store.release(obj)
+        self.generation += 1
+        del self.name_seq[name]
+        self.stale_names.add(name)
+        for pattern, matches in self.regexp_matches.values():
+            matches.pop(name, None)
+        # Delete all links connected to the object.
+        for link in list(self.incident_links.get(name, ())):
+            self.delete(link.name)
+        if self.layout:
+            self.layout.remove_node(name)
+
+    def _enlist(self, obj):
+        """Put cell object OBJ in the render list if it is visible.  Objects
+        of the same priority are rendered in the order of definition."""
+        if not obj.visible:
+            return
+        priority = obj.priority
+        bucket = self.render_buckets.get(priority, None)
+        if bucket is None:
+            bucket = self.render_buckets[priority] = {}
+            bisect.insort(self.render_priorities, priority)
+        elif self.name_seq[obj.name] < self.name_seq[next(reversed(
+                bucket)).name]:
+            # Re-enlisted objects (e.g., unhidden) are sorted when the render
+            # list is rebuilt.
+            self.unsorted_priorities.add(priority)
+        bucket[obj] = True
+        self.render_priority[obj] = priority
+        self.render_cache = None
+
+    def _delist(self, obj):
+        """Remove cell object OBJ from the render list if it is listed."""
+        priority = self.render_priority.pop(obj, None)
+        if priority is None:
+            return
+        bucket = self.render_buckets[priority]
+        del bucket[obj]
+        if not bucket:
+            del self.render_buckets[priority]
+            i = bisect.bisect_left(self.render_priorities, priority)
+            del self.render_priorities[i]
+        self.render_cache = None
+
+    def render_list(self):
+        """Return the list of all visible cell objects in the order of their
+        priorities.  The list is rebuilt only when objects are added, deleted,
+        hidden, unhidden or reprioritized, so the caller must not modify
+        it."""
+        if self.render_cache is None:
+            seq = self.name_seq
+            for priority in self.unsorted_priorities:
+                bucket = self.render_buckets.get(priority, None)
+                if bucket:
+                    self.render_buckets[priority] = dict.fromkeys(
+                        sorted(bucket, key=lambda obj: seq[obj.name]), True)
+            self.unsorted_priorities.clear()
+            self.render_cache = [
+                obj for priority in self.render_priorities
+                for obj in self.render_buckets[priority]
+            ]
+        return self.render_cache
+
+    def hide(self, name):
+        """Make cell object NAME invisible."""
+        obj = self.object(name)
+        self._delist(obj)
+        obj.visible = 0
+
+    def unhide(self, name):
+        """Make cell object NAME visible."""
+        obj = self.object(name)
+        obj.visible = True
+        if obj not in self.render_priority:
+            self._enlist(obj)
+
+    def set_priority(self, name, level):
+        """Change the rendering priority of cell object NAME to LEVEL."""
+        obj = self.object(name)
+        self._delist(obj)
+        obj.priority = level
+        self._enlist(obj)
+
+    def set_layer(self, name, layer):
+        """Move cell object NAME to render layer LAYER.  If LAYER is None,
+        the object is removed from its layer."""
+        obj = self.object(name)
+        obj.layer = layer
+        self.changed([obj])
+
+    def fix(self, name):
+        """Mark cell object NAME as fixed, i.e., never changing."""
+        obj = self.object(name)
+        obj.fixed = True
+        self.changed([obj])
+
+    def changed(self, objs):
+        """Notify the monitor that the appearance of cell objects OBJS has
+        been changed.  Objects attached to them and links connected to them
+        are notified as well since they follow the objects."""
+        if not self.monitor.layered:
+            return
+        affected = []
+        todo = list(objs)
+        while todo:
+            obj = todo.pop()
+            affected.append(obj)
+            todo.extend(obj.children)
+        affected.extend(self.links_touching(obj.name for obj in affected))
+        self.monitor.invalidate(affected)
+
+    def _link(self, link):
+        """Register link object LINK in the adjacency index."""
+        for node in link.src, link.dst:
+            self.incident_links.setdefault(node.name, {})[link] = True
+        if self.layout:
+            self.link_log.extend((link.src.name, link.dst.name))
+
+    def _unlink(self, link):
+        """Unregister link object LINK from the adjacency index."""
+        for node in link.src, link.dst:
+            links = self.incident_links.get(node.name, None)
+            if links is not None:
+                links.pop(link, None)
+                if not links:
+                    del self.incident_links[node.name]
+        if self.layout:
+            self.link_log.extend((link.src.name, link.dst.name))
+
+    def links_of(self, name):
+        """Return the list of link objects connected to cell object NAME."""
+        return list(self.incident_links.get(name, ()))
+
+    def links_touching(self, names):
+        """Return the list of link objects connected to any of cell objects
+        NAMES.  For instance, links_touching(obj.name for obj in
+        self.moving) gives the links that must be re-rendered because their
+        endpoints have moved."""
+        links = {}
+        for name in names:
+            links.update(self.incident_links.get(name, ()))
+        return list(links)
+
+    def _ungroup(self, obj):
+        """Remove cell object OBJ from all groups it belongs to."""
+        for group in obj.groups:
+            members = self.groups[group]
+            del members[obj.name]
+            if not members:
+                del self.groups[group]
+
+    def tag(self, name, group):
+        """Make cell object NAME be a member of group GROUP."""
+        obj = self.object(name)
+        if not obj:
+            die("tag: object '{}' not found".format(name))
+        obj.groups = obj.groups | {group}
+        self.groups.setdefault(group, {})[name] = True
+
+    def group_members(self, group):
+        """Return the list of names of all cell objects in group GROUP."""
+        return list(self.groups.get(group, ()))
+
+    def sorted_names(self):
+        """Return the sorted list of object names.  The list may contain
+        names of deleted objects."""
+        if self.unindexed_names:
+            self.name_index.extend(self.unindexed_names)
+            self.name_index.sort()
+            self.unindexed_names = []
+        if len(self.stale_names) > len(self.name_index) / 2:
+            self.name_index = [
+                name for name in self.name_index
+                if name not in self.stale_names
+            ]
+            self.stale_names = set()
+        return self.name_index
+
+    def names_with_prefix(self, prefix):
+        """Return the list of object names starting with PREFIX in the order
+        of registration."""
+        names = self.sorted_names()
+        found = []
+        i = bisect.bisect_left(names, prefix)
+        while i < len(names) and names[i].startswith(prefix):
+            if names[i] in self.objects:
+                found.append(names[i])
+            i += 1
+        found.sort(key=self.name_seq.__getitem__)
+        return found
+
+    def names_matching(self, regexp):
+        """Return the list of object names matching regular expression REGEXP
+        in the order of registration.  Matches are memoized and updated
+        whenever an object is added or deleted.  Anchored regular expressions
+        such as '^v' are searched only within the names having the literal
+        prefix."""
+        try:
+            pattern, matches = self.regexp_matches[regexp]
+            self.regexp_matches.move_to_end(regexp)
+            return list(matches)
+        except KeyError:
+            pass
+        pattern = re.compile(regexp)
+        prefix = literal_prefix(regexp)
+        if prefix:
+            candidates = self.names_with_prefix(prefix)
+        else:
+            candidates = self.all_object_names()
+        matches = {name: True for name in candidates if pattern.search(name)}
+        self.regexp_matches[regexp] = pattern, matches
+        if len(self.regexp_matches) > MAX_MEMOIZED_REGEXPS:
+            self.regexp_matches.popitem(last=False)
+        return list(matches)
 
     def animate(self, name, x, y):
         """Set the goal of cell object NAME to the geometry (X, Y)."""
@@ -77,23 +459,82 @@ class Cell:
             die("animate: object '{}' not found".format(name))
         obj.goal_x, obj.goal_y = x, y
         obj.velocity = max(obj.dist_to_goal() / self.frame_rate, 1.)
+        self.moving[obj] = True
+
+    def _objects_named(self, names, cmd):
+        """Return the list of cell objects having names NAMES.  Abort with the
+        message prefixed with CMD if any object is not found."""
+        objs = [self.objects.get(name, None) for name in names]
+        if None in objs:
+            name = names[objs.index(None)]
+            die("{}: object '{}' not found".format(cmd, name))
+        return objs
+
+    def animate_many(self, names, xs, ys):
+        """Set the goals of cell objects NAMES to the geometries given by the
+        lists XS and YS.  This is equivalent to calling animate for every
+        object, but velocities are computed in a single vectorized
+        operation."""
+        objs = self._objects_named(names, 'animate')
+        index, x, y = self._gather(objs, 'x', 'y')
+        goal_x = numpy.array(xs, dtype=float)
+        goal_y = numpy.array(ys, dtype=float)
+        dx = goal_x - x
+        dy = goal_y - y
+        velocity = numpy.maximum(
+            numpy.sqrt(dx * dx + dy * dy) / self.frame_rate, 1.)
+        if index is not None:
+            self.store.goal_x[index] = goal_x
+            self.store.goal_y[index] = goal_y
+            self.store.velocity[index] = velocity
+        else:
+            for obj, gx, gy, v in zip(objs, xs, ys, velocity.tolist()):
+                obj.goal_x, obj.goal_y, obj.velocity = gx, gy, v
+        for obj in objs:
+            self.moving[obj] = True
+
+    def move_many(self, names, xs, ys):
+        """Move cell objects NAMES to the geometries given by the lists XS and
+        YS.  Attached objects are repositioned accordingly."""
+        objs = self._objects_named(names, 'move')
+        for obj in objs:
+            if obj.parent:
+                die("move: cannot move attached object '{}'".format(obj.name))
+        if self.store:
+            index = self.store.indices(objs)
+            self.store.x[index] = xs
+            self.store.y[index] = ys
+        else:
+            for obj, x, y in zip(objs, xs, ys):
+                obj.x, obj.y = x, y
+        for obj in objs:
+            for child in obj.children:
+                child.reposition()
+        self.changed(objs)
+
+    def color_many(self, names, colors, alphas):
+        """Change the colors of cell objects NAMES to COLORS.  The alpha of an
+        object is also changed if the corresponding element of ALPHAS is not
+        None."""
+        objs = self._objects_named(names, 'color')
+        for obj, color, alpha in zip(objs, colors, alphas):
+            obj.color = color
+            if alpha is not None:
+                obj.alpha = alpha
+        self.changed(objs)
+
+    def fade(self, name):
+        """Start fading out cell object NAME."""
+        obj = self.object(name)
+        if not obj:
+            die("fade: object '{}' not found".format(name))
+        obj.fade_out = True
+        self.fading[obj] = True
 
     def as_dot_string(self, names):
         """Generate a string representing all cell objects and their linkages
         as an undirected graph in the DOT (GraphViz) format."""
-        astr = 'graph export {\n'
-        is_exported = {}
-        for name in names:
-            # FIXME: Node size should use object width and height.
-            astr += '  "{}" [width="2"];\n'.format(name)
-            is_exported[name] = True
-        for obj in self.all_objects():
-            if obj.type_ == 'link':
-                src, dst = obj.src.name, obj.dst.name
-                if is_exported.get(src, None) and is_exported.get(dst, None):
-                    astr += '"{}" -- "{}";\n'.format(src, dst)
-        astr += '}\n'
-        return astr
+        return cellx.dot_string(names, self.edges_among(names))
 
     def _fit_within(self, x1, y1, x2, y2, positions):
         """Fit a set of positions within a specified bounding box defined by
@@ -127,39 +568,113 @@ class Cell:
             obj = self.object(name)
             x, y = positions[name]
             obj.move(x, y)
+        self.changed(self.object(name) for name in positions)
+
+    def edges_among(self, names):
+        """Return the list of pairs of object names connected by link
+        objects.  Only links connecting objects in NAMES are included."""
+        is_member = {name: True for name in names}
+        edges = []
+        for obj in self.links_touching(names):
+            src, dst = obj.src.name, obj.dst.name
+            if is_member.get(src, None) and is_member.get(dst, None):
+                edges.append((src, dst))
+        return edges
+
+    def layout_key(self, names, edges, filter, bbox, packed=False):
+        """Return the hash string identifying the layout of nodes NAMES
+        connected by EDGES, which is computed with layout command FILTER and
+        fitted within bounding box BBOX.  PACKED indicates whether connected
+        components are laid out separately.  The key is independent of the
+        order of nodes and edges, and of the direction of edges."""
+        graph = [
+            sorted(names),
+            sorted(sorted(edge) for edge in edges), filter,
+            [float(v) for v in bbox], packed
+        ]
+        return hashlib.sha256(json.dumps(graph).encode()).hexdigest()
+
+    def _layout_path(self, key):
+        return os.path.join(self.layout_cache_dir, key + '.json')
+
+    def cached_layout(self, key):
+        """Return the positions of the layout identified by KEY if it has
+        been memoized in memory or saved on disk.  Otherwise, return None."""
+        positions = self.layout_cache.get(key, None)
+        if positions is None and self.layout_cache_dir:
+            try:
+                with open(self._layout_path(key)) as f:
+                    positions = {
+                        name: tuple(pos)
+                        for name, pos in json.load(f).items()
+                    }
+            except (OSError, ValueError):
+                positions = None
+            if positions is not None:
+                self._memoize_layout(key, positions)
+        if positions is None:
+            self.layout_cache_misses += 1
+        else:
+            self.layout_cache_hits += 1
+            self.layout_cache.move_to_end(key)
+        return positions
+
+    def _memoize_layout(self, key, positions):
+        self.layout_cache[key] = positions
+        while len(self.layout_cache) > MAX_MEMOIZED_LAYOUTS:
+            self.layout_cache.popitem(last=False)
+
+    def save_layout(self, key, positions):
+        """Memoize POSITIONS as the layout identified by KEY.  POSITIONS is
+        also saved on disk if the cache directory is specified."""
+        self._memoize_layout(key, positions)
+        if not self.layout_cache_dir:
+            return
+        os.makedirs(self.layout_cache_dir, exist_ok=True)
+        # Write to a temporary file first so that other processes never read
+        # a partially-written layout.
+        fd, tmp = tempfile.mkstemp(dir=self.layout_cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(positions, f)
+        os.replace(tmp, self._layout_path(key))
 
     def spring(self, x1, y1, x2, y2, names, opts):
         """Automatically position all objects in NAMES within the area
         surrounded by (X1, Y1) and (X2, Y2).  Options are passed with
         dictionary OPTS.  OPTS['f'] specifies a layout command (default:
-        'neato').  OPTS['r'] specifies the rotation in degrees (default:
-        0)."""
+        'neato').  If OPTS['f'] is 'builtin', the built-in force-directed
+        layout is used instead of an external command.  OPTS['r'] specifies
+        the rotation in degrees (default: 0).  If OPTS['i'] is specified,
+        objects are positioned incrementally by subsequent display calls
+        (see incremental_spring).  If OPTS['p'] is specified, connected
+        components are laid out in parallel and packed into the area.
+        Layouts are memoized with the key computed
+        from objects, their links, the layout command, and the area."""
         filter = opts.get('f', 'neato')
         rotate = opts.get('r', 0)
         animate = opts.get('a', None)
+        packed = bool(opts.get('p', None))
 
-        # Export parent objects in DOT format.
-        tmpf = tempfile.NamedTemporaryFile(delete=True)
-        pipe = os.popen('{} >{}'.format(filter, tmpf.name), mode='w')
         names = [name for name in names \
                     if not self.object(name).parent and self.object(name).type_ != 'link'
         ]
-        pipe.write(self.as_dot_string(names))
-        pipe.close()
-
-        # Parse GraphViz output and extract object positions.
-        buf = tmpf.read().decode()
-        buf = re.sub('\n', '', buf)
-        positions = {}
-        for line in buf.split(']'):
-            m = re.search(r'(\S+)\s*\[.*pos="([\d.-]+),([\d.-]+)",', line)
-            if m:
-                name, x, y = m.group(1), float(m.group(2)), float(m.group(3))
-                name = name.replace('\"', '')
-                positions[name] = (x, y)
-
-        # Rescale all objects to fit within the area.
-        positions = self._fit_within(x1, y1, x2, y2, positions)
+        if opts.get('i', None):
+            if animate or rotate or packed or 'f' in opts:
+                die("spring: -i cannot be combined with -a, -f, -p, or -r")
+            self.incremental_spring(x1, y1, x2, y2, names)
+            return
+        edges = self.edges_among(names)
+        key = self.layout_key(names, edges, filter, (x1, y1, x2, y2),
+                              packed)
+        positions = self.cached_layout(key)
+        if positions is None:
+            if packed:
+                positions = cellx.parallel_layout(filter, names, edges)
+            else:
+                positions = cellx.graph_layout(filter, names, edges)
+            # Rescale all objects to fit within the area.
+            positions = self._fit_within(x1, y1, x2, y2, positions)
+            self.save_layout(key, positions)
         for name in positions:
             if animate:
                 self.animate(name, *positions[name])
@@ -173,6 +688,40 @@ class Cell:
                 self.object(name).rotate_around(rotate,
                                                 self.width() / 2,
                                                 self.height() / 2)
+        self.changed(self.object(name) for name in names)
+
+    def incremental_spring(self, x1, y1, x2, y2, names):
+        """Incrementally position all objects in NAMES within the area
+        surrounded by (X1, Y1) and (X2, Y2).  The layout starts from the
+        current positions of objects.  Only objects added since the last call
+        and objects near links added or deleted since the last call are
+        moved by subsequent display calls."""
+        layout = self.layout
+        if not layout or layout.bbox != (x1, y1, x2, y2):
+            layout = self.layout = cellx.IncrementalLayout(x1, y1, x2, y2)
+            self.link_log = []
+        touched = set(self.link_log)
+        self.link_log = []
+        current = set(names)
+        for name in layout.index.keys() - current:
+            touched.update(layout.neighbors[name])
+            layout.remove_node(name)
+        added = [
+            name for name in dict.fromkeys(names) if name not in layout.index
+        ]
+        layout.add_nodes([(name, self.object(name).x, self.object(name).y)
+                          for name in added])
+        touched.update(added)
+        for name in touched:
+            if name not in layout.index:
+                continue
+            neighbors = []
+            for link in self.incident_links.get(name, ()):
+                other = link.dst if link.src.name == name else link.src
+                if other.name in layout.index and other.name != name:
+                    neighbors.append(other.name)
+            layout.set_neighbors(name, neighbors)
+        layout.touch(touched)
 
     def display(self):
         """Display all cell objects through its monitor object.  Render
@@ -197,39 +746,103 @@ class Cell:
                         time.sleep(delay)
                 self.last_display = time.time()
 
-        def _update_position(self, obj):
-            dx = obj.goal_x - obj.x
-            dy = obj.goal_y - obj.y
-            # Close encough to the destination?
-            if abs(dx) < obj.velocity and abs(dy) < obj.velocity:
-                obj.velocity = None
-                return
-            dist = math.sqrt(dx**2 + dy**2)
-            obj.shift(dx / dist * obj.velocity, dy / dist * obj.velocity)
-
-        def _update_alpha(self, obj):
-            obj.alpha = obj.alpha - 1 / self.frame_rate
-            if obj.alpha <= 0:
-                self.delete(obj.name)
-                sorted_objs.remove(obj)
+        # Advance the incremental layout by a bounded number of iterations.
+        if self.layout:
+            positions = self.layout.step(LAYOUT_ITERATIONS)
+            for name, (x, y) in positions.items():
+                self.object(name).move(x, y)
+            self.changed(self.object(name) for name in positions)
 
-        objs = [obj for obj in self.all_objects() if obj.visible]
-        sorted_objs = sorted(objs, key=lambda x: x.priority)
+        sorted_objs = self.render_list()
         # Loop while any object is moving or fading.
         while True:
-            changed = False
-            for obj in sorted_objs:
-                if obj.velocity:  # Is moving?
-                    _update_position(self, obj)
-                    changed = True
-                if obj.fade_out:  # Is fading?
-                    _update_alpha(self, obj)
-                    changed = True
+            # Hidden objects are neither animated nor faded.
+            moving = [obj for obj in self.moving if obj.visible]
+            fading = [obj for obj in self.fading if obj.visible]
+            if moving:
+                self.step_positions(moving)
+            if fading:
+                if self.step_alphas(fading):
+                    sorted_objs = self.render_list()
             _display(self, sorted_objs)
-            if not changed:
+            if not moving and not fading:
                 break
         self.update_status()
 
+    def _gather(self, objs, *attrs):
+        """Return the values of attributes ATTRS of all cell objects in OBJS
+        as arrays.  If the columnar store is enabled, the array of row indices
+        is returned as the first element."""
+        if self.store:
+            index = self.store.indices(objs)
+            return [index] + [getattr(self.store, attr)[index] for attr in attrs]
+        return [None] + [
+            numpy.fromiter((getattr(obj, attr) for obj in objs),
+                           dtype=float,
+                           count=len(objs)) for attr in attrs
+        ]
+
+    def step_positions(self, objs):
+        """Move all cell objects in OBJS toward their goals by their
+        velocities in a single vectorized operation.  The velocity of an
+        object is cleared when the object is close enough to its goal.
+        Attached objects are repositioned accordingly."""
+        for obj in objs:
+            if obj.parent:
+                die("move: cannot move attached object '{}'".format(obj.name))
+        index, x, y, goal_x, goal_y, velocity = self._gather(
+            objs, 'x', 'y', 'goal_x', 'goal_y', 'velocity')
+        dx = goal_x - x
+        dy = goal_y - y
+        # Close encough to the destination?
+        arrived = (abs(dx) < velocity) & (abs(dy) < velocity)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            dist = numpy.sqrt(dx * dx + dy * dy)
+            new_x = numpy.where(arrived, x, x + dx / dist * velocity)
+            new_y = numpy.where(arrived, y, y + dy / dist * velocity)
+        if index is not None:
+            self.store.x[index] = new_x
+            self.store.y[index] = new_y
+            self.store.velocity[index[arrived]] = numpy.nan
+            for obj in objs:
+                for child in obj.children:
+                    child.reposition()
+            for i in numpy.flatnonzero(arrived).tolist():
+                self.moving.pop(objs[i], None)
+            self.changed(objs)
+            return
+        for obj, x, y, done in zip(objs, new_x.tolist(), new_y.tolist(),
+                                   arrived.tolist()):
+            if done:
+                obj.velocity = None
+                self.moving.pop(obj, None)
+            else:
+                obj.x, obj.y = x, y
+                for child in obj.children:
+                    child.reposition()
+        self.changed(objs)
+
+    def step_alphas(self, objs):
+        """Decrease the alpha of all fading cell objects in OBJS in a single
+        vectorized operation.  Objects becoming transparent are deleted, and
+        the set of deleted objects is returned."""
+        index, alpha = self._gather(objs, 'alpha')
+        alpha = alpha - 1 / self.frame_rate
+        if index is not None:
+            self.store.alpha[index] = alpha
+        else:
+            for obj, a in zip(objs, alpha.tolist()):
+                obj.alpha = a
+        self.changed(objs)
+        faded = set()
+        for i in numpy.flatnonzero(alpha <= 0).tolist():
+            obj = objs[i]
+            # The object may have been deleted with its node.
+            if self.object(obj.name) is obj:
+                self.delete(obj.name)
+            faded.add(obj)
+        return faded
+
     def wait(self):
         """Perform wait operation through the monior object."""
         self.monitor.wait()
@@ -247,14 +860,31 @@ class Cell:
             return 'FPS: {:.2f}, OBJ: {}'.format(fps, nobjs)
 
         # FIXME: Avoid hard-coding.
-        obj = cellx.Object(
-            type='text',
-            name='_status',
-            text=status_string(self),
-            size=10,
-            x=96,
-            y=self.height - 10,
-            color='white',
-            priority=10,
-        )
+        attrs = dict(size=10,
+                     x=96,
+                     y=self.height - 10,
+                     color='white',
+                     alpha=1,
+                     priority=10,
+                     visible=True,
+                     fade_out=False,
+                     fixed=None,
+                     layer=None,
+                     parent=None)
+        text = status_string(self)
+        obj = self.object('_status')
+        # Update the text in place to keep the render list intact, unless
+        # other commands (e.g., color with a regexp) have changed the object.
+        if obj and obj.velocity is None and all(
+                getattr(obj, name) == value for name, value in attrs.items()):
+            if obj.text != text:
+                obj.text = text
+                obj._text_cache = []
+                self.changed([obj])
+            # Number automatically-named objects as if the object were
+            # redefined.
+            cellx.object.max_id += 1
+            return
+
+        obj = cellx.Object(type='text', name='_status', text=text, **attrs)
         self.add(obj)
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+#
+# Force-directed graph layout.
+# Copyright (c) 2018-2023, Hiroyuki Ohsaki.
+# All rights reserved.
+#
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import concurrent.futures
+import math
+import os
+import re
+import subprocess
+
+import numpy
+
+# Graphs larger than this are laid out with the grid approximation.
+GRID_THRESHOLD = 1000
+# The average number of nodes per grid cell.
+NODES_PER_CELL = 50
+# The number of rows processed at once in exact repulsion.
+CHUNK_SIZE = 256
+# Components are laid out in parallel only if the total number of nodes
+# exceeds this.
+PARALLEL_THRESHOLD = 200
+# The fraction of the square reserved for each component in packing.
+COMPONENT_MARGIN = .1
+# The maximum displacement of coincident nodes in incremental layout,
+# relative to the size of the area.
+COINCIDENT_JITTER = .01
+
+def _repulsion(pos, other, mass, k):
+    """Return the displacements of nodes at positions POS caused by
+    repulsive forces from point masses MASS at positions OTHER.  Point
+    masses at the same position as a node exert no force."""
+    disp = numpy.empty_like(pos)
+    for i in range(0, len(pos), CHUNK_SIZE):
+        x = pos[i:i + CHUNK_SIZE, 0:1]
+        y = pos[i:i + CHUNK_SIZE, 1:2]
+        dx = x - other[:, 0]
+        dy = y - other[:, 1]
+        dist2 = dx * dx + dy * dy
+        dist2[dist2 == 0] = numpy.inf
+        weight = mass * (k * k) / dist2
+        # Sum of WEIGHT * (POS - OTHER) computed with matrix products.
+        total = weight.sum(axis=1)
+        disp[i:i + CHUNK_SIZE, 0] = x[:, 0] * total - weight @ other[:, 0]
+        disp[i:i + CHUNK_SIZE, 1] = y[:, 0] * total - weight @ other[:, 1]
+    return disp
+
+def _exact_repulsion(pos, k):
+    """Return the displacements of all nodes at positions POS caused by
+    repulsive forces between all pairs of nodes."""
+    return _repulsion(pos, pos, 1., k)
+
+def _grid_repulsion(pos, k):
+    """Return the approximate displacements of all nodes at positions POS.
+    Nodes are binned into a grid.  Forces from nodes in the same grid cell
+    are computed exactly, and those from other grid cells are approximated
+    by the forces from their centroids."""
+    n = len(pos)
+    size = max(1, int(math.sqrt(n / NODES_PER_CELL)))
+    lower = pos.min(axis=0)
+    span = numpy.maximum(pos.max(axis=0) - lower, 1e-9)
+    cell_xy = numpy.minimum((pos - lower) / span * size, size - 1).astype(int)
+    cell = cell_xy[:, 0] * size + cell_xy[:, 1]
+
+    # Mass and centroid of every occupied grid cell.
+    _, members = numpy.unique(cell, return_inverse=True)
+    mass = numpy.bincount(members).astype(float)
+    centroid = numpy.stack([
+        numpy.bincount(members, weights=pos[:, 0]),
+        numpy.bincount(members, weights=pos[:, 1])
+    ],
+                           axis=1) / mass[:, None]
+
+    # Forces from all grid cells, from which the force from its own grid
+    # cell is subtracted.
+    disp = _repulsion(pos, centroid, mass, k)
+    delta = pos - centroid[members]
+    dist2 = (delta**2).sum(axis=1)
+    dist2[dist2 == 0] = numpy.inf
+    disp -= delta * (mass[members] * k * k / dist2)[:, None]
+
+    # Exact forces within every grid cell.
+    order = numpy.argsort(members, kind='stable')
+    bounds = numpy.cumsum(mass.astype(int))
+    start = 0
+    for end in bounds.tolist():
+        if end - start > 1:
+            index = order[start:end]
+            disp[index] += _exact_repulsion(pos[index], k)
+        start = end
+    return disp
+
+def spring_layout(names, edges, positions=None, iterations=100, seed=0):
+    """Lay out a graph with nodes NAMES and edges EDGES using the
+    Fruchterman-Reingold force-directed algorithm, and return the positions
+    of nodes as a dictionary.  EDGES is a list of pairs of node names.
+    Initial positions can be given with dictionary POSITIONS; otherwise,
+    nodes are randomly placed using random seed SEED.  Graphs with many nodes
+    are laid out with the grid approximation of repulsive forces."""
+    names = list(names)
+    n = len(names)
+    if n == 0:
+        return {}
+    index = {name: i for i, name in enumerate(names)}
+    rng = numpy.random.default_rng(seed)
+    pos = rng.random((n, 2))
+    if positions:
+        for name, (x, y) in positions.items():
+            if name in index:
+                pos[index[name]] = x, y
+    pairs = numpy.array([(index[u], index[v]) for u, v in edges
+                         if u in index and v in index and u != v],
+                        dtype=int).reshape(-1, 2)
+
+    # Work in the unit square.
+    lower = pos.min(axis=0)
+    scale = max((pos.max(axis=0) - lower).max(), 1e-9)
+    pos = (pos - lower) / scale
+    k = math.sqrt(1 / n)
+    temperature = .1
+    for step in range(iterations):
+        if n > GRID_THRESHOLD:
+            disp = _grid_repulsion(pos, k)
+        else:
+            disp = _exact_repulsion(pos, k)
+        if len(pairs):
+            delta = pos[pairs[:, 0]] - pos[pairs[:, 1]]
+            dist = numpy.sqrt((delta**2).sum(axis=1))
+            force = delta * (dist / k)[:, None]
+            for axis in range(2):
+                disp[:, axis] -= numpy.bincount(pairs[:, 0],
+                                                weights=force[:, axis],
+                                                minlength=n)
+                disp[:, axis] += numpy.bincount(pairs[:, 1],
+                                                weights=force[:, axis],
+                                                minlength=n)
+        # Limit the displacement by the temperature.
+        length = numpy.sqrt((disp**2).sum(axis=1))
+        limit = temperature * (1 - step / iterations)
+        ratio = numpy.minimum(length, limit) / numpy.maximum(length, 1e-12)
+        pos += disp * ratio[:, None]
+
+    pos = pos * scale + lower
+    return {name: (float(x), float(y)) for name, (x, y) in zip(names, pos)}
+
+def dot_string(names, edges):
+    """Return a string representing nodes NAMES and edges EDGES as an
+    undirected graph in the DOT (GraphViz) format."""
+    astr = 'graph export {\n'
+    for name in names:
+        # FIXME: Node size should use object width and height.
+        astr += '  "{}" [width="2"];\n'.format(name)
+    for src, dst in edges:
+        astr += '"{}" -- "{}";\n'.format(src, dst)
+    astr += '}\n'
+    return astr
+
+def filter_layout(filter, names, edges):
+    """Lay out a graph with nodes NAMES and edges EDGES using an external
+    layout command FILTER (e.g., 'neato'), and return the positions of nodes
+    as a dictionary."""
+    buf = subprocess.run(filter,
+                         shell=True,
+                         input=dot_string(names, edges).encode(),
+                         stdout=subprocess.PIPE).stdout.decode()
+    # Parse GraphViz output and extract node positions.
+    buf = re.sub('\n', '', buf)
+    positions = {}
+    for line in buf.split(']'):
+        m = re.search(r'(\S+)\s*\[.*pos="([\d.-]+),([\d.-]+)",', line)
+        if m:
+            name, x, y = m.group(1), float(m.group(2)), float(m.group(3))
+            name = name.replace('\"', '')
+            positions[name] = (x, y)
+    return positions
+
+def graph_layout(filter, names, edges):
+    """Lay out a graph with nodes NAMES and edges EDGES, and return the
+    positions of nodes as a dictionary.  If FILTER is 'builtin', the
+    built-in force-directed layout is used.  Otherwise, FILTER is invoked as
+    an external layout command."""
+    if len(names) == 1:
+        return {names[0]: (0., 0.)}
+    if filter == 'builtin':
+        return spring_layout(names, edges)
+    return filter_layout(filter, names, edges)
+
+def connected_components(names, edges):
+    """Split a graph with nodes NAMES and edges EDGES into connected
+    components.  Return the list of pairs of nodes and edges of components,
+    which is sorted in the descending order of the number of nodes."""
+    root = {name: name for name in names}
+
+    def find(name):
+        while root[name] != name:
+            root[name] = root[root[name]]
+            name = root[name]
+        return name
+
+    for u, v in edges:
+        ru, rv = find(u), find(v)
+        if ru != rv:
+            root[ru] = rv
+    components = {}
+    for name in names:
+        components.setdefault(find(name), ([], []))[0].append(name)
+    for u, v in edges:
+        components[find(u)][1].append((u, v))
+    return sorted(components.values(), key=lambda c: -len(c[0]))
+
+def pack_components(layouts):
+    """Pack the list of layouts LAYOUTS of connected components into a
+    single layout, and return the positions of all nodes as a dictionary.
+    Every component is rescaled into a square whose area is proportional to
+    the number of its nodes, and squares are placed on shelves from left to
+    right and from bottom to top."""
+    sides = [math.sqrt(len(positions)) for positions in layouts]
+    width = max(max(sides, default=0), math.sqrt(sum(s * s for s in sides)))
+    packed = {}
+    x = y = shelf_height = 0
+    for positions, side in zip(layouts, sides):
+        if x + side > width:
+            x, y = 0, y + shelf_height
+            shelf_height = 0
+        xs = [p[0] for p in positions.values()]
+        ys = [p[1] for p in positions.values()]
+        xmin, ymin = min(xs), min(ys)
+        span = max(max(xs) - xmin, max(ys) - ymin)
+        margin = side * COMPONENT_MARGIN
+        scale = (side - 2 * margin) / span if span else 0
+        for name, (px, py) in positions.items():
+            # Center single-node components.
+            if not span:
+                packed[name] = (x + side / 2, y + side / 2)
+            else:
+                packed[name] = (x + margin + (px - xmin) * scale,
+                                y + margin + (py - ymin) * scale)
+        x += side
+        shelf_height = max(shelf_height, side)
+    return packed
+
+def parallel_layout(filter, names, edges, workers=None):
+    """Lay out every connected component of a graph with nodes NAMES and
+    edges EDGES in parallel using at most WORKERS processes, and return the
+    positions of all nodes packed into a single layout.  FILTER is passed to
+    graph_layout."""
+    components = connected_components(names, edges)
+    args = ([filter] * len(components), [c[0] for c in components],
+            [c[1] for c in components])
+    if len(components) > 1 and len(names) > PARALLEL_THRESHOLD \
+        and (workers or os.cpu_count() or 1) > 1:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            layouts = list(pool.map(graph_layout, *args))
+    else:
+        layouts = list(map(graph_layout, *args))
+    return pack_components(layouts)
+
+class IncrementalLayout:
+    def __init__(self, x1, y1, x2, y2, iterations=50):
+        """Create an incremental force-directed layout within the area
+        surrounded by (X1, Y1) and (X2, Y2).  Nodes affected by changes are
+        moved for at most ITERATIONS iterations after every change."""
+        self.bbox = x1, y1, x2, y2
+        self.iterations = iterations
+        self.names = []
+        self.index = {}
+        self.pos = numpy.empty((0, 2))
+        self.neighbors = {}
+        # Nodes to be moved, and the pairs of indices of their edges.
+        self.active = []
+        self.pairs = None
+        self.budget = 0
+        self.temperature = 0
+        # Random numbers for separating coincident nodes.
+        self.rng = numpy.random.default_rng(0)
+
+    def ideal_length(self):
+        """Return the ideal edge length for the current number of nodes."""
+        x1, y1, x2, y2 = self.bbox
+        return math.sqrt(abs((x2 - x1) * (y2 - y1)) / max(len(self.names), 1))
+
+    def add_nodes(self, nodes):
+        """Add nodes NODES given as a list of (NAME, X, Y).  A node at the
+        same position as another node is slightly displaced since coincident
+        nodes exert no repulsive force on each other."""
+        x1, y1, x2, y2 = self.bbox
+        jitter = COINCIDENT_JITTER * max(abs(x2 - x1), abs(y2 - y1))
+        occupied = set(map(tuple, self.pos.tolist()))
+        positions = []
+        for name, x, y in nodes:
+            if (x, y) in occupied:
+                x, y = (numpy.array([x, y]) +
+                        self.rng.uniform(-1, 1, 2) * jitter).tolist()
+            occupied.add((x, y))
+            positions.append((x, y))
+            self.index[name] = len(self.names)
+            self.names.append(name)
+            self.neighbors[name] = set()
+        # Positions are stacked at once since every append copies the array.
+        self.pos = numpy.concatenate(
+            [self.pos, numpy.array(positions, dtype=float).reshape(-1, 2)])
+
+    def remove_node(self, name):
+        """Remove node NAME if it exists.  The last node is moved to the
+        place of the removed node."""
+        i = self.index.pop(name, None)
+        if i is None:
+            return
+        last = self.names.pop()
+        if last != name:
+            self.names[i] = last
+            self.index[last] = i
+            self.pos[i] = self.pos[-1]
+        self.pos = self.pos[:-1]
+        for other in self.neighbors.pop(name):
+            self.neighbors[other].discard(name)
+        # Indices may have changed.
+        self.active = [n for n in self.active if n in self.index]
+        self.pairs = None
+
+    def set_neighbors(self, name, neighbors):
+        """Replace the set of neighbors of node NAME with NEIGHBORS."""
+        for other in self.neighbors[name]:
+            self.neighbors[other].discard(name)
+        self.neighbors[name] = set(neighbors)
+        for other in neighbors:
+            self.neighbors[other].add(name)
+
+    def touch(self, names):
+        """Mark nodes NAMES and their neighbors to be moved."""
+        active = {}
+        for name in self.active:
+            active[name] = True
+        for name in names:
+            if name in self.index:
+                active[name] = True
+                for other in self.neighbors[name]:
+                    active[other] = True
+        self.active = list(active)
+        self.pairs = None
+        self.budget = self.iterations
+        self.temperature = self.ideal_length()
+
+    def step(self, iterations):
+        """Move active nodes for at most ITERATIONS iterations, and return
+        their new positions as a dictionary.  Nodes become inactive when the
+        iteration budget is exhausted or the layout has converged."""
+        if not self.active or not self.budget:
+            return {}
+        index = numpy.array([self.index[name] for name in self.active])
+        if self.pairs is None:
+            self.pairs = numpy.array(
+                [(i, self.index[other])
+                 for i, name in enumerate(self.active)
+                 for other in self.neighbors[name]],
+                dtype=int).reshape(-1, 2)
+        k = self.ideal_length()
+        x1, y1, x2, y2 = self.bbox
+        for _ in range(min(iterations, self.budget)):
+            pos = self.pos[index]
+            disp = _repulsion(pos, self.pos, 1., k)
+            if len(self.pairs):
+                delta = pos[self.pairs[:, 0]] - self.pos[self.pairs[:, 1]]
+                dist = numpy.sqrt((delta**2).sum(axis=1))
+                force = delta * (dist / k)[:, None]
+                for axis in range(2):
+                    disp[:, axis] -= numpy.bincount(self.pairs[:, 0],
+                                                    weights=force[:, axis],
+                                                    minlength=len(index))
+            length = numpy.sqrt((disp**2).sum(axis=1))
+            ratio = numpy.minimum(length, self.temperature) / numpy.maximum(
+                length, 1e-12)
+            pos += disp * ratio[:, None]
+            pos[:, 0] = numpy.clip(pos[:, 0], min(x1, x2), max(x1, x2))
+            pos[:, 1] = numpy.clip(pos[:, 1], min(y1, y2), max(y1, y2))
+            self.pos[index] = pos
+            self.temperature *= .9
+            self.budget -= 1
+            if (length * ratio).max() < k * .01:
+                self.budget = 0
+        positions = {
+            name: (float(x), float(y))
+            for name, (x, y) in zip(self.active, self.pos[index])
+        }
+        if not self.budget:
+            self.active = []
+            self.pairs = None
+        return positions
@@ -88,6 +88,8 @@ class Palette:
     def __init__(self, color_scheme=0):
         self.color_scheme = color_scheme
         self.palette = {}
+        # Incremented whenever a color is defined.
+        self.generation = 0
 
     def define_color(self, name, r, g, b, a=1):
         """Define color NAME whose RGBA values are R, G, B, and A.  If R, G,
@@ -102,6 +104,7 @@ class Palette:
         if a <= 1:
             a *= 0xff
         self.palette[name] = [int(r), int(g), int(b), int(a)]
+        self.generation += 1
 
     def rgba(self, name, alpha=1.):
         """Return R, G, B, and A values of color NAME as a tuple.  If ALPHA is
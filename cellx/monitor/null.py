@@ -18,9 +18,18 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import numpy
+
 import cellx.monitor.color
 
+# Types of objects drawn as line segments.
+LINE_TYPES = ('line', 'link', 'wire')
+
 class Null:
+    # Whether objects are drawn in cached layers, which must be notified of
+    # changes with the invalidate method.
+    layered = False
+
     def __init__(self,
                  width=800,
                  height=600,
@@ -90,6 +99,77 @@ class Null:
         for segment in segments:
             self.draw_line(*segment, obj.width, obj.color, obj.alpha)
 
+    def line_segments(self, objs):
+        """Return the line segments of line, link, and wire objects in list
+        OBJS as a pair of arrays.  The first array has a row of (SX, SY, DX,
+        DY, WIDTH) for every segment, and the second has the index of the
+        object in OBJS drawing the segment.  A wire is split into three
+        segments as in '_render_wire'."""
+        rows = []
+        for obj in objs:
+            if obj.type_ == 'link':
+                src, dst = obj.src, obj.dst
+                rows.append((src.x, src.y, dst.x, dst.y, obj.width, False))
+            else:
+                rows.append((obj.x, obj.y, obj.x2, obj.y2, obj.width,
+                             obj.type_ == 'wire'))
+        x, y, x2, y2, width, wire = numpy.array(rows,
+                                                dtype=float).reshape(-1, 6).T
+        wire = wire.astype(bool)
+        # Every object has three slots of segments, and only wires use all.
+        segments = numpy.empty((len(rows), 3, 5))
+        segments[:, 0] = numpy.column_stack((x, y, x2, y2, width))
+        xsign = numpy.sign(x2 - x)
+        ysign = numpy.sign(y2 - y)
+        delta = width / 2
+        xmid = (x + x2) / 2
+        # Slightly extend wires to draw smooth corners.
+        segments[:, 0, 2] = numpy.where(wire, xmid + xsign * delta, x2)
+        segments[:, 0, 3] = numpy.where(wire, y, y2)
+        segments[:, 1] = numpy.column_stack(
+            (xmid, y - ysign * delta, xmid, y2 + ysign * delta, width))
+        segments[:, 2] = numpy.column_stack(
+            (xmid - xsign * delta, y2, x2, y2, width))
+        used = numpy.zeros((len(rows), 3), dtype=bool)
+        used[:, 0] = True
+        used[:, 1:] = wire[:, None]
+        index = numpy.repeat(numpy.arange(len(rows)), 3)
+        return segments[used], index[used.ravel()]
+
+    def line_quads(self, segments):
+        """Return the quadrilaterals covering line segments SEGMENTS, which
+        is the first array returned by 'line_segments'.  The array has four
+        vertices of (X, Y) along the boundary of every quadrilateral."""
+        sx, sy, dx, dy, width = segments.T
+        theta = numpy.arctan2(dy - sy, dx - sx)
+        xx = width / 2 * numpy.cos(numpy.pi / 2 + theta)
+        yy = width / 2 * numpy.sin(numpy.pi / 2 + theta)
+        corners = [(sx + xx, sy + yy), (dx + xx, dy + yy), (dx - xx, dy - yy),
+                   (sx - xx, sy - yy)]
+        return numpy.array(corners).reshape(4, 2, -1).transpose(2, 0, 1)
+
+    def render_lines(self, objs):
+        """Render line, link, and wire objects in list OBJS.  Monitors
+        drawing many segments at once should override this method using
+        'line_segments' and 'line_quads'."""
+        for obj in objs:
+            self.render(obj)
+
+    def render_many(self, objs):
+        """Render all objects in list OBJS in order.  Consecutive line,
+        link, and wire objects are rendered at once with 'render_lines'."""
+        batch = []
+        for obj in objs:
+            if obj.type_ in LINE_TYPES:
+                batch.append(obj)
+                continue
+            if batch:
+                self.render_lines(batch)
+                batch = []
+            self.render(obj)
+        if batch:
+            self.render_lines(batch)
+
     def render(self, obj):
         """Render an object with its specified type-specific rendering method.
         This method renders an object using its specified rendering method
@@ -118,8 +198,12 @@ class Null:
             self._render_wire(obj)
 
     def render_objects(self, objs):
-        for obj in objs:
-            self.render(obj)
+        self.render_many(objs)
+
+    def invalidate(self, objs):
+        """Notify that the appearance of objects in list OBJS has changed
+        since the last frame."""
+        pass
 
     def display(self):
         pass
@@ -18,8 +18,10 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import collections
 import contextlib
 import math
+import weakref
 
 # Discard messages when loading pygame modules.
 with contextlib.redirect_stdout(None):
@@ -31,34 +33,128 @@ import cellx
 from cellx.monitor.null import Null
 from perlcompat import warn
 
+# Redraw the whole window if dirty regions cover more than this fraction.
+DIRTY_AREA_LIMIT = .5
+# Dirty regions are merged into one if there are more than this many.
+MAX_DIRTY_RECTS = 64
+# Margin in pixels around bounding boxes for rounding and antialiasing.
+DIRTY_MARGIN = 2
+
+# The bottom-most render layer containing fixed objects not in any layer.
+FIXED_LAYER = 'fixed'
+
+# The number of line segments converted into lists at once.  Converting
+# all segments at once keeps so many lists alive that the garbage collector
+# runs repeatedly.
+LINE_CHUNK = 1024
+
+# Upper limit of the memory used by cached sprites in bytes.
+MAX_SPRITE_BYTES = 64 << 20
+# Types of objects drawn as sprites.
+SPRITE_TYPES = ('box', 'ellipse', 'polygon')
+# Shapes smaller than this in pixels are drawn directly since looking up
+# sprites costs more than drawing them.
+SPRITE_MIN_AREA = 40 * 40
+
+# The number of rendered lines of text shared by all text objects.
+MAX_CACHED_TEXTS = 1024
+# Text of objects changed this many times (e.g., counters) is not cached so
+# that it does not evict other text from the cache.
+VOLATILE_TEXT_CHANGES = 3
+
+# Attributes affecting the appearance of an object.
+STATE_ATTRIBUTES = ('type_', 'x', 'y', 'width', 'height', 'color',
+                    'frame_color', 'alpha', 'n', 'rotation', 'text', 'size',
+                    'align', 'file', 'x2', 'y2', 'x3', 'y3')
+
+def close_rects(rects, bboxes):
+    """Merge overlapping rectangles in list RECTS, and return the list of
+    disjoint rectangles.  Rectangles are enlarged so that every rectangle in
+    list BBOXES is either contained in or apart from them."""
+    closed = []
+    rects = list(rects)
+    while rects:
+        rect = rects.pop()
+        i = rect.collidelist(closed)
+        if i >= 0:
+            rects.append(rect.union(closed.pop(i)))
+            continue
+        grown = rect.unionall([bboxes[j] for j in rect.collidelistall(bboxes)]
+                              or [rect])
+        if grown != rect:
+            rects.append(grown)
+        else:
+            closed.append(rect)
+    return closed
+
 class SDL(Null):
+    layered = True
+
     def __init__(self, alpha=255, *kargs, **kwargs):
         """Initialize the graphics context with default settings.  This
         constructor initializes an instance of the graphics context with default
         settings. It sets various attributes and flags, such as 'pause', 'font_cache',
-        'rendered', and 'enable_sound', and then calls the 'init' method to
+        'layer_names', and 'enable_sound', and then calls the 'init' method to
         perform additional initialization."""
         super().__init__(*kargs, **kwargs)
         self.alpha = alpha
         self.pause = False
         self.font_cache = {}
-        self.rendered = {}
         self.enable_sound = False
+        # Render layers from the bottom to the top.
+        self.layer_names = [FIXED_LAYER]
+        # Objects drawn in every layer, and surfaces holding every layer
+        # composited over all layers below it.
+        self.layer_members = {}
+        self.layer_surfaces = {}
+        # The layer of every object in the last partitioned render list.
+        self.layer_of = {}
+        self.dirty_layers = set()
+        # The last partitioned render list, objects in every layer, and
+        # objects not in any layer.
+        self.partitioned = None
+        self.members = {}
+        self.dynamic_objs = []
+        # States and bounding boxes of objects not in any layer in the last
+        # frame.
+        self.last_states = {}
+        # Regions still converging under alpha blending, with the number of
+        # remaining frames.
+        self.settling = []
+        # Regions to be updated on the window, or None for the whole window.
+        self.dirty_rects = None
+        self.full_redraw = True
+        self.palette_generation = None
+        # Pre-rendered shapes in the least-recently-used order.
+        self.sprites = collections.OrderedDict()
+        self.sprite_bytes = 0
+        self.sprite_hits = 0
+        self.sprite_misses = 0
+        # Sprites and their positions to be drawn with a single call.
+        self.blit_queue = []
+        # Rendered lines of text in the least-recently-used order.
+        self.text_cache = collections.OrderedDict()
+        self.text_hits = 0
+        self.text_misses = 0
+        # The number of times the text of every object has been rendered.
+        self.text_renders = weakref.WeakKeyDictionary()
         self.init()
 
     def init(self):
         """Initialize the graphics context and associated resources.  This
         method performs the initialization of the graphics context, including
         initializing the display, font system, and optionally sound. It sets
-        up the screen, fixed surface, and sound system (if available). If
+        up the screen, background surface, and sound system (if available). If
         sound initialization fails, it continues without enabling sound."""
         pygame.display.init()
         pygame.font.init()
         width, height = self.width, self.height
         self.hwscreen = pygame.display.set_mode((width, height))
-        self.fixed_surface = pygame.Surface((width, height), 0, self.hwscreen)
+        self.background = pygame.Surface((width, height), 0, self.hwscreen)
         self.current_frame = pygame.Surface((width, height), 0, self.hwscreen)
         self.current_frame.set_alpha(self.alpha)
+        self.screen_rect = self.hwscreen.get_rect()
+        self.settle_frames = self._settle_frames()
         try:
             pygame.mixer.init()
             self.enable_sound = True
@@ -66,23 +162,63 @@ class SDL(Null):
             warn(
                 'failed to initialize sound mixer.  continue without sound...')
 
+    def _settle_frames(self):
+        """Return the number of frames for a pixel of the window to stop
+        changing once the frame is unchanged.  The window converges slowly to
+        the frame since the frame is alpha blended with the window."""
+        if self.alpha >= 255:
+            return 1
+        src = pygame.Surface((1, 1), 0, self.hwscreen)
+        src.set_alpha(self.alpha)
+        dst = pygame.Surface((1, 1), 0, self.hwscreen)
+        nframes = 1
+        for fg, bg in [((255, 255, 255), (0, 0, 0)),
+                       ((0, 0, 0), (255, 255, 255))]:
+            src.fill(fg)
+            dst.fill(bg)
+            last = None
+            for n in range(1, 1024):
+                dst.blit(src, (0, 0))
+                pixel = dst.get_at((0, 0))
+                if pixel == last:
+                    break
+                last = pixel
+            nframes = max(nframes, n)
+        return nframes
+
     def draw_line(self, sx, sy, dx, dy, width, color, alpha):
         """Draw a filled line segment between two points with specified
         attributes.  This method draws a filled line segment between the
         starting point (SX, SY) and the destination point (DX, DY) with the
         specified line WIDTH, COLOR, and ALPHA transparency. The line is drawn
-        with triangles to fill the area between the line segments, creating a
-        solid appearance."""
+        as a filled quadrilateral, creating a solid appearance."""
         theta = math.atan2(dy - sy, dx - sx)
         xx = width / 2 * math.cos(math.pi / 2 + theta)
         yy = width / 2 * math.sin(math.pi / 2 + theta)
         color = self.palette.rgba(color, alpha)
-        pygame.gfxdraw.filled_trigon(self.screen, int(sx + xx), int(sy + yy),
-                                     int(sx - xx), int(sy - yy), int(dx + xx),
-                                     int(dy + yy), color)
-        pygame.gfxdraw.filled_trigon(self.screen, int(dx + xx), int(dy + yy),
-                                     int(dx - xx), int(dy - yy), int(sx - xx),
-                                     int(sy - yy), color)
+        pygame.gfxdraw.filled_polygon(
+            self.screen, ((int(sx + xx), int(sy + yy)),
+                          (int(dx + xx), int(dy + yy)),
+                          (int(dx - xx), int(dy - yy)),
+                          (int(sx - xx), int(sy - yy))), color)
+
+    def render_lines(self, objs):
+        """Render line, link, and wire objects in list OBJS at once.  The
+        quadrilaterals of all segments are computed together, which leaves a
+        single drawing call per segment."""
+        self.flush_sprites()
+        segments, index = self.line_segments(objs)
+        # Truncate vertices toward zero like 'draw_line'.
+        quads = self.line_quads(segments).astype(int).reshape(-1, 8)
+        colors = [self.palette.rgba(obj.color, obj.alpha) for obj in objs]
+        screen = self.screen
+        filled_polygon = pygame.gfxdraw.filled_polygon
+        for start in range(0, len(quads), LINE_CHUNK):
+            end = start + LINE_CHUNK
+            for (x1, y1, x2, y2, x3, y3, x4, y4), i in zip(
+                    quads[start:end].tolist(), index[start:end].tolist()):
+                filled_polygon(screen, ((x1, y1), (x2, y2), (x3, y3),
+                                        (x4, y4)), colors[i])
 
     def _render_bitmap(self, obj):
         """Render a bitmap (image) object with specified attributes.  This
@@ -92,18 +228,7 @@ class SDL(Null):
         caches it for future use. If the bitmap dimensions do not match the
         specified width and height, it resizes the image while maintaining its
         aspect ratio. Finally, it blits (draws) the image onto the screen."""
-        if not obj._bitmap_cache:
-            file = obj.file
-            img = pygame.image.load_extended(file)
-            if not img:
-                cellx.die('pygame.image.load_extended(%s) failed.', file)
-            obj._bitmap_cache = img
-            if obj.width is None:
-                obj.width = img.get_width()
-            if obj.height is None:
-                obj.height = img.get_height()
-
-        img = obj._bitmap_cache
+        img = self._load_bitmap(obj)
         # Resize the image if required.
         if obj.width != img.get_width() or obj.height != img.get_height():
             zoom_x = obj.width / img.get_width()
@@ -117,30 +242,107 @@ class SDL(Null):
         y = obj.y - obj.height / 2
         self.screen.blit(img, (x, y))
 
+    def _load_bitmap(self, obj):
+        """Return the image of bitmap object OBJ.  The image is loaded from
+        the file when first referred, and its size is used as the size of OBJ
+        unless specified."""
+        if not obj._bitmap_cache:
+            file = obj.file
+            img = pygame.image.load_extended(file)
+            if not img:
+                cellx.die('pygame.image.load_extended(%s) failed.', file)
+            obj._bitmap_cache = img
+            if obj.width is None:
+                obj.width = img.get_width()
+            if obj.height is None:
+                obj.height = img.get_height()
+        return obj._bitmap_cache
+
+    def sprite(self, draw, args, size, color):
+        """Return the sprite of SIZE pixels drawn by 'gfxdraw' function DRAW
+        with arguments ARGS and color COLOR.  Sprites are cached, and the
+        least-recently-used ones are discarded when the total size exceeds
+        MAX_SPRITE_BYTES."""
+        key = draw, args, size, color
+        sprite = self.sprites.get(key, None)
+        if sprite is not None:
+            self.sprites.move_to_end(key)
+            self.sprite_hits += 1
+            return sprite
+        self.sprite_misses += 1
+        # Draw an opaque shape on a color-keyed surface, and blend it with
+        # the surface alpha, which gives the same pixels as drawing directly.
+        sprite = pygame.Surface(size, 0, self.hwscreen)
+        colorkey = (0, 0, 0) if color[:3] != (0, 0, 0) else (255, 255, 255)
+        sprite.fill(colorkey)
+        draw(sprite, *args, color[:3] + (255, ))
+        sprite.set_colorkey(colorkey, pygame.RLEACCEL)
+        if color[3] < 255:
+            sprite.set_alpha(color[3], pygame.RLEACCEL)
+        self.sprites[key] = sprite
+        self.sprite_bytes += sprite.get_pitch() * sprite.get_height()
+        while self.sprite_bytes > MAX_SPRITE_BYTES and len(self.sprites) > 1:
+            old = self.sprites.popitem(last=False)[1]
+            self.sprite_bytes -= old.get_pitch() * old.get_height()
+        return sprite
+
+    def flush_sprites(self):
+        """Draw all queued sprites on the screen at once."""
+        if self.blit_queue:
+            self.screen.blits(self.blit_queue, doreturn=False)
+            self.blit_queue = []
+
+    def render(self, obj):
+        """Render object OBJ.  Queued sprites are drawn first unless OBJ is
+        also drawn as a sprite, so that objects are drawn in order."""
+        if obj.type_ not in SPRITE_TYPES:
+            self.flush_sprites()
+        super().render(obj)
+
     def _render_box(self, obj):
         """Render a filled box (rectangle) object with specified attributes.
         This method renders a filled box (rectangle) object with the specified
         center coordinates, width, height, color, alpha transparency, and
         optional frame color. The box is drawn using Pygame's 'Rect' and
-        'gfxdraw' functions."""
+        'gfxdraw' functions, and cached as sprites."""
         x, y = obj.x, obj.y
         rect = pygame.Rect(x - obj.width / 2, y - obj.height / 2, obj.width,
                            obj.height)
         color = self.palette.rgba(obj.color, obj.alpha)
-        pygame.gfxdraw.box(self.screen, rect, color)
+        if rect.width < 1 or rect.height < 1 or \
+            rect.width * rect.height < SPRITE_MIN_AREA:
+            self.flush_sprites()
+            pygame.gfxdraw.box(self.screen, rect, color)
+            if obj.frame_color:
+                color = self.palette.rgba(obj.frame_color, obj.alpha)
+                pygame.gfxdraw.rectangle(self.screen, rect, color)
+            return
+        args = (0, 0) + rect.size,
+        self.blit_queue.append(
+            (self.sprite(pygame.gfxdraw.box, args, rect.size,
+                         color), rect.topleft))
         if obj.frame_color:
             color = self.palette.rgba(obj.frame_color, obj.alpha)
-            pygame.gfxdraw.rectangle(self.screen, rect, color)
+            self.blit_queue.append(
+                (self.sprite(pygame.gfxdraw.rectangle, args, rect.size,
+                             color), rect.topleft))
 
     def _render_ellipse(self, obj):
         """Render a filled ellipse object with specified attributes.  This
         method renders a filled ellipse object with the specified center
         coordinates, width, height, color, and alpha transparency. The ellipse
-        is drawn using Pygame's 'gfxdraw.filled_ellipse' function."""
+        is drawn using Pygame's 'gfxdraw.filled_ellipse' function, and cached
+        as a sprite."""
         color = self.palette.rgba(obj.color, obj.alpha)
         rx, ry = int(obj.width / 2), int(obj.height / 2)
-        pygame.gfxdraw.filled_ellipse(self.screen, int(obj.x), int(obj.y), rx,
-                                      ry, color)
+        if rx < 0 or ry < 0 or (2 * rx + 1) * (2 * ry + 1) < SPRITE_MIN_AREA:
+            self.flush_sprites()
+            pygame.gfxdraw.filled_ellipse(self.screen, int(obj.x), int(obj.y),
+                                          rx, ry, color)
+            return
+        sprite = self.sprite(pygame.gfxdraw.filled_ellipse, (rx, ry, rx, ry),
+                             (2 * rx + 1, 2 * ry + 1), color)
+        self.blit_queue.append((sprite, (int(obj.x) - rx, int(obj.y) - ry)))
 
     def _render_spline(self, obj):
         """Render a cubic Bezier spline curve with specified attributes.  This
@@ -158,10 +360,22 @@ class SDL(Null):
         """Render a filled polygon with specified attributes.  This method
         renders a filled polygon with the specified vertices, color, and alpha
         transparency. The polygon is drawn using Pygame's
-        'gfxdraw.filled_polygon' function."""
+        'gfxdraw.filled_polygon' function, and cached as a sprite."""
         vertices = obj.vertices()
         color = self.palette.rgba(obj.color, obj.alpha)
-        pygame.gfxdraw.filled_polygon(self.screen, vertices, color)
+        if obj.width * obj.width < SPRITE_MIN_AREA:
+            self.flush_sprites()
+            pygame.gfxdraw.filled_polygon(self.screen, vertices, color)
+            return
+        # Vertices are truncated to integers as 'gfxdraw' does.
+        vertices = [(int(x), int(y)) for x, y in vertices]
+        xs, ys = zip(*vertices)
+        left, top = min(xs), min(ys)
+        size = max(xs) - left + 1, max(ys) - top + 1
+        points = tuple((x - left, y - top) for x, y in vertices)
+        sprite = self.sprite(pygame.gfxdraw.filled_polygon, (points, ), size,
+                             color)
+        self.blit_queue.append((sprite, (left, top)))
 
     def _render_text(self, obj):
         """Render text with specified attributes.  This method renders text
@@ -169,59 +383,276 @@ class SDL(Null):
         transparency. It caches rendered text lines for efficiency and
         calculates the dimensions of the text block. The rendered text is then
         positioned and aligned according to the specified attributes."""
-        if not obj._text_cache:
-            if not self.font_cache.get(obj.size, None):
-                font = pygame.font.SysFont('Helvetica', obj.size)
-                if not font:
-                    cellx.die('pygame.font.SysFont() failed.')
-                self.font_cache[obj.size] = font
+        lines = self._text_surfaces(obj)
+        ypos = obj.y - obj.height / 2
+        for text, width, height in lines:
+            # Center by default.
+            xpos = obj.x - obj.width / 2 + (obj.width - width) / 2
+            if obj.align == 'left':
+                xpos = obj.x
+            elif obj.align == 'right':
+                xpos = obj.x - width
+            self.screen.blit(text, (xpos, ypos))
+            ypos += height
+
+    def font(self, size):
+        """Return the font of size SIZE."""
+        if not self.font_cache.get(size, None):
+            font = pygame.font.SysFont('Helvetica', size)
+            if not font:
+                cellx.die('pygame.font.SysFont() failed.')
+            self.font_cache[size] = font
+        return self.font_cache[size]
+
+    def text_line(self, line, size, color, cache=True):
+        """Return the rendered line LINE of text in font size SIZE and color
+        COLOR as a tuple of the surface, the width, and the height.  Rendered
+        lines are shared by all text objects if CACHE is True, and the
+        least-recently-used ones are discarded if more than MAX_CACHED_TEXTS
+        lines are cached."""
+        key = line, size, color
+        rendered = self.text_cache.get(key, None)
+        if rendered is not None:
+            self.text_cache.move_to_end(key)
+            self.text_hits += 1
+            return rendered
+        self.text_misses += 1
+        text = self.font(size).render(line, 1, color)
+        rendered = text, text.get_width(), text.get_height()
+        if not cache:
+            return rendered
+        self.text_cache[key] = rendered
+        if len(self.text_cache) > MAX_CACHED_TEXTS:
+            self.text_cache.popitem(last=False)
+        return rendered
 
-            font = self.font_cache[obj.size]
+    def _text_surfaces(self, obj):
+        """Return the list of rendered lines of text object OBJ.  Lines are
+        rendered when first referred, and the size of the text block is used
+        as the size of OBJ."""
+        if not obj._text_cache:
+            nrenders = self.text_renders.get(obj, 0) + 1
+            self.text_renders[obj] = nrenders
+            cache = nrenders <= VOLATILE_TEXT_CHANGES
             width, height = 0, 0
             color = self.palette.rgba('white')
+            obj._text_cache = []
             for line in obj.text.split('\\\\'):
-                text = font.render(line, 1, color)
-                obj._text_cache.append(text)
-                width = max(width, text.get_width())
-                height += text.get_height()
+                rendered = self.text_line(line, obj.size, color, cache)
+                obj._text_cache.append(rendered)
+                width = max(width, rendered[1])
+                height += rendered[2]
             obj.width = width
             obj.height = height
+        return obj._text_cache
 
-        ypos = obj.y - obj.height / 2
-        for text in obj._text_cache:
-            # Center by default.
-            xpos = obj.x - obj.width / 2 + (obj.width - text.get_width()) / 2
-            if obj.align == 'left':
-                xpos = obj.x
-            elif obj.align == 'right':
-                xpos = obj.x - text.get_width()
-            self.screen.blit(text, (xpos, ypos))
-            ypos += text.get_height()
+    def bounding_rect(self, obj):
+        """Return the rectangle covering all pixels drawn for object OBJ."""
+        type = obj.type_
+        if type in ('line', 'wire', 'link'):
+            if type == 'link':
+                xs, ys = (obj.src.x, obj.dst.x), (obj.src.y, obj.dst.y)
+            else:
+                xs, ys = (obj.x, obj.x2), (obj.y, obj.y2)
+            pad = (obj.width or 1) / 2
+            left, right = min(xs) - pad, max(xs) + pad
+            top, bottom = min(ys) - pad, max(ys) + pad
+        elif type == 'polygon':
+            xs, ys = zip(*obj.vertices())
+            left, right, top, bottom = min(xs), max(xs), min(ys), max(ys)
+        elif type == 'spline':
+            xs, ys = (obj.x, obj.x2, obj.x3), (obj.y, obj.y2, obj.y3)
+            left, right, top, bottom = min(xs), max(xs), min(ys), max(ys)
+        else:
+            if type == 'bitmap':
+                self._load_bitmap(obj)
+            elif type == 'text':
+                self._text_surfaces(obj)
+            width, height = obj.width or 0, obj.height or 0
+            left = obj.x - width / 2
+            if type == 'text' and obj.align == 'left':
+                left = obj.x
+            elif type == 'text' and obj.align == 'right':
+                left = obj.x - width
+            top = obj.y - height / 2
+            right, bottom = left + width, top + height
+        left, top = int(left) - DIRTY_MARGIN, int(top) - DIRTY_MARGIN
+        return pygame.Rect(left, top,
+                           int(right) - left + DIRTY_MARGIN + 1,
+                           int(bottom) - top + DIRTY_MARGIN + 1)
 
-    def render_objects(self, objs):
-        """Render a list of objects, both fixed and non-fixed.  This method
-        renders a list of objects, iterating through the provided 'objs'
-        list. It first renders fixed but not-yet-rendered objects, then resets
-        the surface to the pre-rendered state. After that, it renders
-        non-fixed objects. Rendering is based on the object's type-specific
-        rendering method."""
-        # Render fixed but not-rendered objects.
-        self.screen = self.fixed_surface
+    def object_state(self, obj):
+        """Return the tuple of attributes determining the appearance of object
+        OBJ."""
+        state = tuple(getattr(obj, attr) for attr in STATE_ATTRIBUTES)
+        if obj.type_ == 'link':
+            state += (obj.src.x, obj.src.y, obj.dst.x, obj.dst.y)
+        return state
+
+    def invalidate(self, objs):
+        """Mark layers containing objects in list OBJS to be redrawn.  The
+        render list is partitioned again if any object has been moved to
+        another layer.  New layers are stacked over existing ones."""
+        layer_of = self.layer_of
+        for obj in objs:
+            layer = layer_of.get(obj, None)
+            if layer is not None:
+                self.dirty_layers.add(layer)
+            new = obj.layer or (FIXED_LAYER if obj.fixed else None)
+            if layer != new:
+                self.partitioned = None
+                if new is not None and new not in self.layer_names:
+                    self.layer_names.append(new)
+
+    def partition(self, objs):
+        """Divide list OBJS into members of layers and objects not in any
+        layer.  Fixed objects without a layer belong to FIXED_LAYER."""
+        members = {name: [] for name in self.layer_names}
+        dynamic = []
+        layer_of = {}
         for obj in objs:
-            if obj.fixed and not self.rendered.get(obj, None):
-                self.render(obj)
-                self.rendered[obj] = True
+            layer = obj.layer or (FIXED_LAYER if obj.fixed else None)
+            if layer is None:
+                dynamic.append(obj)
+                continue
+            if layer not in members:
+                self.layer_names.append(layer)
+                members[layer] = []
+            members[layer].append(obj)
+            layer_of[obj] = layer
+        self.partitioned = objs
+        self.members = members
+        self.dynamic_objs = dynamic
+        self.layer_of = layer_of
 
-        # Reset to pre-rendered suface.
-        self.current_frame.blit(self.fixed_surface, (0, 0))
+    def render_layers(self, dirty):
+        """Redraw layers whose members have been changed, and return the
+        surface of all layers composited.  A layer is redrawn from the surface
+        of the layer below it, so that all layers above it must be redrawn as
+        well.  Objects added at the end of a layer are simply drawn over it.
+        Regions changed on the composited surface are appended to list
+        DIRTY."""
+        below = self.background
+        rebuild = False
+        for name in self.layer_names:
+            objs = self.members[name]
+            drawn = self.layer_members.get(name, [])
+            if not objs:
+                # Layers above an emptied layer lose their base.
+                rebuild = rebuild or bool(drawn)
+                self.layer_members.pop(name, None)
+                self.layer_surfaces.pop(name, None)
+                continue
+            surface = self.layer_surfaces.get(name, None)
+            if objs is drawn and not rebuild and \
+                name not in self.dirty_layers:
+                below = surface
+                continue
+            if surface is None:
+                surface = self.layer_surfaces[name] = pygame.Surface(
+                    (self.width, self.height), 0, self.hwscreen)
+                rebuild = True
+            if rebuild or name in self.dirty_layers or \
+                objs[:len(drawn)] != drawn:
+                surface.blit(below, (0, 0))
+                new = objs
+                rebuild = True
+                dirty.append(self.screen_rect)
+            else:
+                new = objs[len(drawn):]
+                rebuild = bool(new)
+                dirty.extend(self.bounding_rect(obj) for obj in new)
+            self.screen = surface
+            self.render_many(new)
+            self.flush_sprites()
+            self.layer_members[name] = objs
+            below = surface
+        self.dirty_layers.clear()
+        return below
 
-        # Render non-fixed objects.
-        self.screen = self.current_frame
+    def dirty_regions(self, objs, dirty):
+        """Compare the states of objects in list OBJS with those in the last
+        frame, and return the list of regions to be redrawn.  DIRTY is the
+        list of regions already known to be changed.  Regions are enlarged to
+        contain all objects overlapping with them, so that objects can be
+        redrawn without clipping, which changes rasterization."""
+        states = {}
+        last_states = self.last_states
         for obj in objs:
-            if not obj.fixed:
-                self.render(obj)
+            state = self.object_state(obj)
+            last = last_states.pop(obj, None)
+            if last and last[0] == state:
+                states[obj] = last
+                continue
+            rect = self.bounding_rect(obj)
+            states[obj] = state, rect
+            dirty.append(rect)
+            if last:
+                dirty.append(last[1])
+        # Objects disappeared since the last frame.
+        dirty.extend(rect for state, rect in last_states.values())
+        self.last_states = states
 
-        self.hwscreen.blit(self.current_frame, (0, 0))
+        # Changed regions must be redrawn until the window converges.
+        rects = [rect for rect, n in self.settling] + dirty
+        self.settling = [(rect, n - 1) for rect, n in self.settling if n > 1]
+        if self.settle_frames > 1:
+            self.settling += [(rect, self.settle_frames - 1) for rect in dirty]
+        bboxes = [rect for state, rect in states.values()]
+        # Merging regions takes quadratic time, so many regions are unified
+        # in advance.
+        if len(rects) > MAX_DIRTY_RECTS:
+            rects = [rects[0].unionall(rects)]
+        rects = close_rects(rects, bboxes)
+        rects = [rect.clip(self.screen_rect) for rect in rects]
+        return [rect for rect in rects if rect.width and rect.height]
+
+    def render_objects(self, objs):
+        """Render a list of objects, both in layers and not in any layer.
+        This method renders a list of objects, iterating through the provided
+        'objs' list. It first redraws layers whose objects have been changed,
+        then restores regions changed since the last frame from the composited
+        layers and renders other objects overlapping with those regions.  The
+        whole frame is redrawn if changed regions are large.  Rendering is
+        based on the object's type-specific rendering method."""
+        dirty = []
+        # All colors may have been changed.
+        if self.palette.generation != self.palette_generation:
+            self.palette_generation = self.palette.generation
+            self.dirty_layers.update(self.layer_names)
+            dirty.append(self.screen_rect)
+        if objs is not self.partitioned:
+            self.partition(objs)
+        base = self.render_layers(dirty)
+        objs = self.dynamic_objs
+
+        rects = self.dirty_regions(objs, dirty)
+        area = sum(rect.width * rect.height for rect in rects)
+        if self.full_redraw or \
+            area > DIRTY_AREA_LIMIT * self.width * self.height:
+            self.full_redraw = False
+            # Reset to pre-rendered suface.
+            self.current_frame.blit(base, (0, 0))
+
+            # Render objects not in any layer.
+            self.screen = self.current_frame
+            self.render_many(objs)
+            self.flush_sprites()
+
+            self.hwscreen.blit(self.current_frame, (0, 0))
+            self.dirty_rects = None
+            return
+
+        self.screen = self.current_frame
+        bboxes = [self.last_states[obj][1] for obj in objs]
+        for rect in rects:
+            # Restore the region from the pre-rendered surface, and redraw
+            # objects overlapping with it in the rendering order.
+            self.current_frame.blit(base, rect, rect)
+            self.render_many([objs[i] for i in rect.collidelistall(bboxes)])
+            self.flush_sprites()
+            self.hwscreen.blit(self.current_frame, rect, rect)
+        self.dirty_rects = rects
 
     def process_events(self):
         """Process pygame events in an infinite loop until explicitly
@@ -244,7 +675,10 @@ class SDL(Null):
                 pygame.display.update()
 
     def display(self):
-        pygame.display.update()
+        if self.dirty_rects is None:
+            pygame.display.update()
+        elif self.dirty_rects:
+            pygame.display.update(self.dirty_rects)
         self.process_events()
 
     def wait(self):
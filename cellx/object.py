@@ -18,6 +18,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import functools
 import math
 
 import cellx
@@ -25,7 +26,127 @@ from perlcompat import die
 
 max_id = 0
 
-class Object:
+@functools.lru_cache(maxsize=1024)
+def polygon_offsets(n, r, rotation):
+    """Return the list of offsets of N vertices from the center of a regular
+    polygon with radius R and rotation ROTATION in degrees."""
+    offsets = []
+    theta = cellx.deg2rad(rotation) - math.pi / 2
+    for _ in range(n):
+        offsets.append((math.cos(theta) * r, math.sin(theta) * r))
+        theta += 2 * math.pi / n
+    return offsets
+
+# Methods shared by all cell objects.  Subclasses provide the attributes.
+class ObjectBase:
+    __slots__ = ()
+
+    def __repr__(self):
+        # box [b1] 24 x 345 @ (34, 38) cyan
+        repr = '{} [{}] {} x {} @ ({}, {}) {}\n'.format(
+            self.type_, self.name, self.width, self.height, self.x, self.y,
+            self.color)
+        return repr
+
+    def move(self, x, y):
+        """Change the geometry of the object to (X, Y).  If this object has
+        children, their geometries are updated."""
+        if self.parent:
+            die("move: cannot move attached object '{}'".format(self.name))
+        else:
+            self.x, self.y = x, y
+            for child in self.children:
+                child.reposition()
+
+    def shift(self, dx, dy):
+        """Change the geometry of the object by (DX, DY)."""
+        self.move(self.x + dx, self.y + dy)
+
+    def resize(self, width, height):
+        """Update the size of the object to WIDTH x HEIGHT."""
+        self.width = width
+        self.height = height
+
+    def dist_to_goal(self):
+        """Return the Euclidian distance to the goal geometry."""
+        dx, dy = self.goal_x - self.x, self.goal_y - self.y
+        # NOTE: Squares are computed as products to be consistent with the
+        # vectorized computation in Cell.step_positions.
+        return math.sqrt(dx * dx + dy * dy)
+
+    def attach(self, parent, dx, dy):
+        """Make the current object be a child of PARENT object with the
+        positional offset of (DX, DY)."""
+        parent.children = [*parent.children, self]
+        self.parent = parent
+        self.x2, self.y2 = dx, dy
+        self.reposition()
+
+    def reposition(self):
+        """Update the geometry of the object according to the position of its
+        parent.  If the object has any children, recursively update their
+        geometrires."""
+        if self.parent:
+            self.x = self.parent.x + self.x2
+            self.y = self.parent.y + self.y2
+        for child in self.children:
+            child.reposition()
+
+    def vertices(self):
+        """Return the list of geometries of all vertices of the polygon
+        object."""
+        if self.type_ != 'polygon':
+            die("vertices: object type muyst be 'polygon'")
+        x, y = self.x, self.y
+        return [[x + dx, y + dy]
+                for dx, dy in polygon_offsets(self.n, self.width / 2,
+                                              self.rotation)]
+
+    def clone(self, name):
+        """Return a new object named NAME having the same attributes as the
+        object.  The new object is neither attached to a parent nor has
+        children."""
+        obj = Object(type=self.type_,
+                     name=name,
+                     x=self.x,
+                     y=self.y,
+                     width=self.width,
+                     height=self.height,
+                     color=self.color,
+                     alpha=self.alpha,
+                     priority=self.priority,
+                     fixed=self.fixed,
+                     layer=self.layer,
+                     visible=self.visible,
+                     fade_out=self.fade_out,
+                     n=self.n,
+                     rotation=self.rotation,
+                     text=self.text,
+                     size=self.size,
+                     align=self.align,
+                     file=self.file,
+                     x2=self.x2,
+                     y2=self.y2,
+                     x3=self.x3,
+                     y3=self.y3,
+                     src=self.src,
+                     dst=self.dst,
+                     frame_color=self.frame_color,
+                     groups=self.groups)
+        obj.goal_x, obj.goal_y = self.goal_x, self.goal_y
+        obj.velocity = self.velocity
+        return obj
+
+    def rotate_around(self, degree, cx, cy):
+        """Rotate the geometry of the object by degree DEGREE with the center
+        (CX, CY)."""
+        theta = cellx.deg2rad(degree)
+        (dx, dy) = (self.x - cx, self.y - cy)
+        (dx, dy) = (dx * math.cos(theta) + dy * math.sin(theta),
+                    dx * math.sin(theta) - dy * math.cos(theta))
+        self.move(cx + dx, cy + dy)
+
+class Object(ObjectBase):
     def generate_name(self, atype, id_):
         return '_{}{}'.format(atype, id_)
 
@@ -41,6 +162,7 @@ class Object:
             alpha=1,
             priority=0,
             fixed=None,
+            layer=None,
             visible=True,
             fade_out=False,
             n=None,
@@ -57,6 +179,7 @@ class Object:
             src=None,
             dst=None,
             frame_color=None,
+            groups=None,
     ):
         global max_id
         max_id += 1
@@ -75,6 +198,7 @@ class Object:
         self.priority = priority
 
         self.fixed = fixed
+        self.layer = layer
         self.visible = visible
         self.fade_out = fade_out
 
@@ -106,73 +230,5 @@ class Object:
         self.goal_y = None
         self.velocity = None
 
-    def __repr__(self):
-        # box [b1] 24 x 345 @ (34, 38) cyan
-        repr = '{} [{}] {} x {} @ ({}, {}) {}\n'.format(
-            self.type_, self.name, self.width, self.height, self.x, self.y,
-            self.color)
-        return repr
-
-    def move(self, x, y):
-        """Change the geometry of the object to (X, Y).  If this object has
-        children, their geometries are updated."""
-        if self.parent:
-            die("move: cannot move attached object '{}'".format(self.name))
-        else:
-            self.x, self.y = x, y
-            for child in self.children:
-                child.reposition()
-
-    def shift(self, dx, dy):
-        """Change the geometry of the object by (DX, DY)."""
-        self.move(self.x + dx, self.y + dy)
-
-    def resize(self, width, height):
-        """Update the size of the object to WIDTH x HEIGHT."""
-        self.width = width
-        self.height = height
-
-    def dist_to_goal(self):
-        """Return the Euclidian distance to the goal geometry."""
-        return math.sqrt((self.goal_x - self.x)**2 + (self.goal_y - self.y)**2)
-
-    def attach(self, parent, dx, dy):
-        """Make the current object be a child of PARENT object with the
-        positional offset of (DX, DY)."""
-        parent.children.append(self)
-        self.parent = parent
-        self.x2, self.y2 = dx, dy
-        self.reposition()
-
-    def reposition(self):
-        """Update the geometry of the object according to the position of its
-        parent.  If the object has any children, recursively update their
-        geometrires."""
-        if self.parent:
-            self.x = self.parent.x + self.x2
-            self.y = self.parent.y + self.y2
-        for child in self.children:
-            child.reposition()
-
-    def vertices(self):
-        """Return the list of geometries of all vertices of the polygon
-        object."""
-        if self.type_ != 'polygon':
-            die("vertices: object type muyst be 'polygon'")
-        vertices = []
-        theta = cellx.deg2rad(self.rotation) - math.pi / 2
-        r = self.width / 2
-        for _ in range(self.n):
-            vertices.append(
-                [self.x + math.cos(theta) * r, self.y + math.sin(theta) * r])
-            theta += 2 * math.pi / self.n
-        return vertices
-
-    def rotate_around(self, degree, cx, cy):
-        """Rotate the geometry of the object by degree DEGREE with the center
-        (CX, CY)."""
-        theta = cellx.deg2rad(degree)
-        (dx, dy) = (self.x - cx, self.y - cy)
-        (dx, dy) = (dx * math.cos(theta) + dy * math.sin(theta),
-                    dx * math.sin(theta) - dy * math.cos(theta))
-        self.move(cx + dx, cy + dy)
+        # Names of groups the object belongs to.
+        self.groups = set(groups) if groups else set()
@@ -18,14 +18,19 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import collections
+import functools
 import math
 import os.path
 import re
 import time
 
+import numpy
+
 import cellx
 from perlcompat import die
 
+@functools.lru_cache(maxsize=65536, typed=True)
 def str2number(v):
     """If V is a string, convert it to a numeric value and return the result.
     Otherwise, V is returned as-is."""
@@ -41,6 +46,33 @@ def str2number(v):
     else:
         return v
 
+# References to variables: $name, ${name}, and $(expression).
+VARIABLE_REGEXP = re.compile(r"""\$(?:([A-Za-z_]\w*)|\{([A-Za-z_]\w*)\}
+                                 |\(([^()]*(?:\([^()]*\)[^()]*)*)\))""",
+                             re.VERBOSE)
+
+# Words of a statement.  Expressions in $(...) may contain white spaces.
+WORD_REGEXP = re.compile(r'(?:\$\((?:[^()]|\([^()]*\))*\)|\S)+')
+
+def split_words(line):
+    """Split statement LINE into the list of words."""
+    if '$' in line:
+        return WORD_REGEXP.findall(line)
+    return line.split()
+
+# Statements are cached once in this number of misses during a long run of
+# misses.
+CACHE_SAMPLE_INTERVAL = 16
+
+# A reference to an object with offsets, e.g., term2+10+10.
+OFFSET_POSITION_REGEXP = re.compile(r'(\w+)([+-][\d.]+)([+-][\d.]+)')
+
+# A positional parameter.
+POSITION_REGEXP = re.compile(r'[\d.eE+-]+')
+
+# Names of variables.  Names starting with __ are reserved in expressions.
+VARIABLE_NAME_REGEXP = re.compile(r'(?!__)[A-Za-z_]\w*$')
+
 def get_args(args, defaults):
     """Convert all strings in list ARGS to numeric values.  If list ARGS is
     shorter than list DEFAULTS, the list is padded with corresponding elements
@@ -48,18 +80,91 @@ def get_args(args, defaults):
     args = [str2number(x) for x in args]
     return args + defaults[len(args):]
 
+# Commands and their shortest abbreviations.  Commands are resolved by
+# searching the table in order, so the order must be kept as it is; e.g.,
+# 'repeat' must come before 'resize' once registered.
+COMMANDS = [
+    ('al', 'alpha'),
+    ('an', 'animate'),
+    ('at', 'attach'),
+    ('bu', 'bulk'),
+    ('c', 'color'),
+    ('de', 'define'),
+    ('di', 'display'),
+    ('en', 'end'),
+    ('fa', 'fade'),
+    ('fi', 'fix'),
+    ('fo', 'for'),
+    ('h', 'hide'),
+    ('k', 'kill'),
+    ('l', 'layer'),
+    ('m', 'move'),
+    ('pa', 'palette'),
+    ('pl', 'play'),
+    ('pr', 'priority'),
+    ('rep', 'repeat'),
+    ('r', 'resize'),
+    ('se', 'set'),
+    ('sh', 'shift'),
+    ('sl', 'sleep'),
+    ('sp', 'spring'),
+    ('u', 'unhide'),
+    ('w', 'wait'),
+]
+
+# Object types, their shortest abbreviations, and option templates.  Types
+# without options have None as the template.
+DEFINE_TYPES = [
+    ('bi', 'bitmap', None),
+    ('bo', 'box', 'f:'),
+    ('e', 'ellipse', 'f:'),
+    ('line', 'line', 'ht'),
+    ('link', 'link', None),
+    ('p', 'polygon', 'r:f:'),
+    ('s', 'spline', 'ht'),
+    ('t', 'text', 'lcr'),
+    ('w', 'wire', 'ht'),
+]
+
 class Parser:
     def __init__(self, cell=None):
         self.lineno = 0
         self.cell = cell
+        # Prefix tables are pairs of the ordered list of (prefix, entry) and
+        # the dictionary caching resolved words.
+        self.command_table = ([(prefix, getattr(self, '_parse_' + name))
+                               for prefix, name in COMMANDS], {})
+        self.define_table = ([(prefix, (getattr(self, 'define_' + atype),
+                                        template))
+                              for prefix, atype, template in DEFINE_TYPES],
+                             {})
+        # LRU cache of compiled statements keyed by the statement text.
+        self.statement_cache = collections.OrderedDict()
+        self.statement_cache_size = 4096
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # The number of misses since the last hit.
+        self.miss_streak = 0
+        # Expanded names, valid while the cell object generation is
+        # unchanged.
+        self.name_cache = {}
+        self.name_cache_generation = None
+        # Integer variables.
+        self.variables = {}
+        # Loop being collected: [header, body lines, nesting depth, whether
+        # in rows of bulk command].
+        self.block = None
+        # Bulk command being collected: (method applying rows, rows).
+        self.bulk = None
 
     def help(self):
         return """\
-al | alpha (name|regexp) alpha
-an | animate name (goal_x goal_y|name[(+|-)dx(+|-)dy])
+al | alpha (name|regexp|@group) alpha
+an | animate (name|regexp|@group) (goal_x goal_y|name[(+|-)dx(+|-)dy])
 at | attach name parent_name dx dy
-c  | color (name|regexp) color [alpha]
-d  | define name type args
+bu | bulk (animate|move|color)
+c  | color (name|regexp|@group) color [alpha]
+d  | define (name|name[first..last]) type [-g group[,group...]] [-P file] args
                  bi | bitmap file [(x y|name[(+|-)dx(+|-)dy])]
                  bo | box [-f color] [width height color (x y|name[(+|-)dx(+|-)dy])]
                  e  | ellipse [-f color] [rx ry color] [(x y|name[(+|-)dx(+|-)dy])]
@@ -70,26 +175,34 @@ d  | define name type args
                  t  | text [-lcr] string [size color (x y|name[(+|-)dx(+|-)dy])]
                  w  | wire [-ht] sx sy dx dy [width color]
 di | display
-fa | fade (name|regexp)...
-fi | fix (name|regexp)...
-h  | hide (name|regexp)...
-k  | kill (name|regexp)...
-m  | move (name|regexp) (x y|name[(+|-)dx(+|-)dy])
+en | end
+fa | fade (name|regexp|@group)...
+fi | fix (name|regexp|@group)...
+fo | for var from to [step]
+h  | hide (name|regexp|@group)...
+k  | kill (name|regexp|@group)...
+l  | layer (layer|-) (name|regexp|@group)...
+m  | move (name|regexp|@group) (x y|name[(+|-)dx(+|-)dy])
 pa | palette symbol (r g b [alpha]|name [alpha])
 pl | play file
-pr | priority (name|regexp) level
-r  | resize (name|regexp) (x y|name[(+|-)dx(+|-)dy])
-sh | shift (name|regexp) dx dy
+pr | priority (name|regexp|@group) level
+rep| repeat count
+r  | resize (name|regexp|@group) (x y|name[(+|-)dx(+|-)dy])
+se | set var expression
+sh | shift (name|regexp|@group) dx dy
 sl | sleep x
-sp | spring [-a] [-f filter] [-r degree] (name|regexp)... [x1 y1 x2 y2]
-u  | unhide (name|regexp)...
+sp | spring [-aip] [-f (filter|builtin)] [-r degree] (name|regexp|@group)... [x1 y1 x2 y2]
+u  | unhide (name|regexp|@group)...
 w  | wait
 """
 
     def abort(self, msg, *args):
         """Display error message MSG with the line number and the content, and
         abort the program execution."""
-        die("{}: {}\n{}\n".format(self.lineno, self.line, msg, *args))
+        line = self.line
+        if type(line) != str:
+            line = ' '.join(line)
+        die("{}: {}\n{}\n".format(self.lineno, line, msg, *args))
 
     def validate_color(self, color):
         """Check the validity of color name COLOR.  If invalid, abort the
@@ -129,7 +242,7 @@ w  | wait
         # FIXME: Shoud not check type.
         if type(arg1) == str:
             # Object name with offset?
-            m = re.search(r'(\w+)([+-][\d.]+)([+-][\d.]+)', arg1)
+            m = OFFSET_POSITION_REGEXP.search(arg1)
             if m:
                 name, dx, dy = m.group(1), m.group(2), m.group(3)
                 dx, dy = self.expand_position(dx, dy)
@@ -141,9 +254,9 @@ w  | wait
                 return (self.cell.object(arg1).x, self.cell.object(arg1).y)
 
             # Must be positions.
-            if not re.search(r'[\d.eE+-]+', arg1):
+            if not POSITION_REGEXP.search(arg1):
                 self.abort("inlvaid positional parameter '%s'", arg1)
-            if not re.search(r'[\d.eE+-]+', arg2):
+            if not POSITION_REGEXP.search(arg2):
                 self.abort("inlvaid positional parameter '%s'", arg2)
             return self.expand_numeric_position(float(arg1), float(arg2))
         else:
@@ -162,7 +275,9 @@ w  | wait
         return [str2number(v) for v in args]
 
     def expand_name(self, name, allow_create=False, allow_nomatch=False):
-        """Expand the name NAME and return the list of matching objects."""
+        """Expand the name NAME and return the list of matching objects.  The
+        result is shared with later calls, so the caller must not modify
+        it."""
         # magic name
         if name == '-':
             return [None]
@@ -171,12 +286,32 @@ w  | wait
         if name == '--':
             return [self.last_name]
 
+        # Group members.
+        if name.startswith('@'):
+            found = self.cell.group_members(name[1:])
+            if not found and not allow_nomatch:
+                self.abort("expand_name: empty group '{}'".format(name[1:]))
+            return found
+
+        # Expansion depends only on the set of object names, so the result
+        # is valid until an object is added or deleted.
+        if self.name_cache_generation != self.cell.generation:
+            self.name_cache.clear()
+            self.name_cache_generation = self.cell.generation
+        key = name, allow_create, allow_nomatch
+        found = self.name_cache.get(key, None)
+        if found is None:
+            found = self._expand_name(name, allow_create, allow_nomatch)
+            self.name_cache[key] = found
+        return found
+
+    def _expand_name(self, name, allow_create, allow_nomatch):
+        """Expand the name NAME without consulting the cache."""
         # Regular expression.
         m = re.match(r'/(.*)/', name)
         if m:
             regexp = m.group(1)
-            matches = [name for name in self.cell.all_object_names() \
-                    if re.search(regexp, name)]
+            matches = self.cell.names_matching(regexp)
             if not matches:
                 if not allow_nomatch:
                     self.abort(
@@ -500,6 +635,84 @@ w  | wait
                                    color)
         return obj
 
+    def _parse_bulk(self, args):
+        """Parse arguments ARGS for bulk command.  Rows until the line end
+        are collected, and applied at once."""
+        self.bulk = self.bulk_method(args), []
+
+    def bulk_method(self, args):
+        """Return the method applying rows of bulk command having arguments
+        ARGS."""
+        if len(args) != 1:
+            self.abort('usage: bulk (animate|move|color)')
+        handler = self.lookup_command(args[0].lower())
+        methods = {
+            self._parse_animate: self.bulk_animate,
+            self._parse_move: self.bulk_move,
+            self._parse_color: self.bulk_color,
+        }
+        if handler not in methods:
+            self.abort("bulk: unsupported command '{}'".format(args[0]))
+        return methods[handler]
+
+    def bulk_positions(self, rows):
+        """Parse ROWS of bulk command, each of which is either 'name x y' or
+        'name name[(+|-)dx(+|-)dy]'.  Return the lists of names, x
+        coordinates, and y coordinates."""
+        names, xs, ys = [], [], []
+        for row in rows:
+            words = row.split()
+            if not words or words[0].startswith('#'):
+                continue
+            if len(words) == 3:
+                try:
+                    x, y = float(words[1]), float(words[2])
+                except ValueError:
+                    self.abort("bulk: invalid row '{}'".format(row))
+                x, y = self.expand_numeric_position(x, y)
+            elif len(words) == 2:
+                target = self.cell.object(words[1])
+                if target:
+                    x, y = target.x, target.y
+                else:
+                    m = OFFSET_POSITION_REGEXP.search(words[1])
+                    if not m or not self.cell.object(m.group(1)):
+                        self.abort("bulk: invalid row '{}'".format(row))
+                    x, y = self.expand_position(words[1])
+            else:
+                self.abort("bulk: invalid row '{}'".format(row))
+            names.append(words[0])
+            xs.append(x)
+            ys.append(y)
+        return names, xs, ys
+
+    def bulk_animate(self, rows):
+        """Apply ROWS of bulk animate command."""
+        self.cell.animate_many(*self.bulk_positions(rows))
+
+    def bulk_move(self, rows):
+        """Apply ROWS of bulk move command."""
+        self.cell.move_many(*self.bulk_positions(rows))
+
+    def bulk_color(self, rows):
+        """Apply ROWS of bulk color command, each of which is 'name color' or
+        'name color alpha'."""
+        names, colors, alphas = [], [], []
+        validated = set()
+        for row in rows:
+            words = row.split()
+            if not words or words[0].startswith('#'):
+                continue
+            if len(words) not in (2, 3):
+                self.abort("bulk: invalid row '{}'".format(row))
+            color = words[1]
+            if color not in validated:
+                validated.add(self.validate_color(color))
+            names.append(words[0])
+            colors.append(color)
+            alphas.append(float(words[2]) if len(words) == 3 else None)
+        self.cell.color_many(names, colors, alphas)
+
     def _parse_color(self, args):
         """Parse and apply a color to one or more objects.  This method takes
         a list of arguments `args`, which can be used to specify the color and
@@ -511,47 +724,88 @@ w  | wait
         elif len(args) == 3:
             name, color, alpha = args
         self.validate_color(color)
-        for n in self.expand_name(name):
-            self.cell.object(n).color = color
+        objs = [self.cell.object(n) for n in self.expand_name(name)]
+        for obj in objs:
+            obj.color = color
             if alpha:
-                self.cell.object(n).alpha = float(alpha)
+                obj.alpha = float(alpha)
+        self.cell.changed(objs)
                 
+    def load_positions(self, file, count):
+        """Load COUNT positions from file FILE, and return the list of
+        absolute geometries.  Every line of FILE must contain x and y
+        separated by white spaces.  Lines starting with # are ignored."""
+        try:
+            rows = numpy.loadtxt(file, ndmin=2, comments='#')
+        except (OSError, ValueError) as e:
+            self.abort('load_positions: {}'.format(e))
+        if rows.shape != (count, 2):
+            self.abort('load_positions: {} positions required in {}'.format(
+                count, file))
+        return [
+            self.expand_numeric_position(x, y) for x, y in rows.tolist()
+        ]
+
     def _parse_define(self, args):
-        """Parse arguments ARGS for define command."""
+        """Parse arguments ARGS for define command.  NAME can be a range of
+        names like v[0..9], which defines objects v0, v1, ..., v9 at once."""
         name, atype, *args = args
+        names = None
+        m = re.match(r'(.*)\[(\d+)\.\.(\d+)\](.*)$', name)
+        if m:
+            prefix, first, last, suffix = m.groups()
+            names = [
+                prefix + str(i) + suffix
+                for i in range(int(first),
+                               int(last) + 1)
+            ]
+            if not names:
+                self.abort("empty range '{}' in define.".format(name))
+            name = names[0]
         name = self.expand_name(name, allow_create=True)[0]
-        atype = atype.lower()
-        if atype.startswith('bi'):  # bitmap
-            self.define_bitmap(name, args)
-        elif atype.startswith('bo'):  # box
-            opts = self.parse_options('f:', args)
-            self.define_box(name, args, opts)
-        elif atype.startswith('e'):  # ellipse
-            opts = self.parse_options('f:', args)
-            self.define_ellipse(name, args, opts)
-        elif atype.startswith('line'):  # line
-            opts = self.parse_options('ht', args)
-            self.define_line(name, args, opts)
-        elif atype.startswith('link'):  # link
-            self.define_link(name, args)
-        elif atype.startswith('p'):  # polygon
-            opts = self.parse_options('r:f:', args)
-            self.define_polygon(name, args, opts)
-        elif atype.startswith('s'):  # spline
-            opts = self.parse_options('ht', args)
-            self.define_spline(name, args, opts)
-        elif atype.startswith('t'):  # text
-            opts = self.parse_options('lcr', args)
-            self.define_text(name, args, opts)
-        elif atype.startswith('w'):  # wire
-            opts = self.parse_options('ht', args)
-            self.define_wire(name, args, opts)
-        else:
+        entry = self.lookup_prefix(self.define_table, atype.lower())
+        if not entry:
             self.abort("unknown object type '{}' in define.".format(atype))
+        method, template = entry
+        # All object types accept group and positions options.
+        opts = self.parse_options((template or '') + 'g:P:', args)
+        groups = opts.pop('g', None)
+        positions = opts.pop('P', None)
+        if positions and not names:
+            self.abort('define: -P requires a range of names.')
+        if template is None:
+            obj = method(name, args)
+        else:
+            obj = method(name, args, opts)
+        if groups:
+            for group in groups.split(','):
+                self.cell.tag(obj.name, group)
+        if not names:
+            return
+        # Other objects in the range are copies of the first one, which may
+        # have been replaced with its view by the columnar store.
+        obj = self.cell.object(obj.name)
+        # Arrowheads and arrowtails of the first object are copied as well.
+        suffixes = [
+            suffix for opt, suffix in [('h', '_head'), ('t', '_tail')]
+            if opt in opts and self.cell.object(name + suffix)
+        ]
+        clones = []
+        for n in names[1:]:
+            clones.append(obj.clone(n))
+            for suffix in suffixes:
+                clones.append(self.cell.object(name + suffix).clone(n +
+                                                                    suffix))
+        clones = self.cell.add_many(clones)
+        objs = [obj] + clones[::len(suffixes) + 1]
+        if positions:
+            for obj, (x, y) in zip(objs, self.load_positions(positions,
+                                                             len(objs))):
+                obj.move(x, y)
 
     def _parse_spring(self, args):
         """Parse arguments ARGS for spring command."""
-        opts = self.parse_options('af:r:', args)
+        opts = self.parse_options('af:ipr:', args)
         x1, y1 = self.cell.width * .05, self.cell.height * .05
         x2, y2 = self.cell.width * .95, self.cell.height * .95
         args = self.expand_names(*args)
@@ -587,95 +841,425 @@ w  | wait
         else:
             die("invalid palette arguments: {}".format(args))
 
-    def parse_single_line(self, line):
-        """Parse a sing line LINE, which can be either a simple statement, a
-        comment, or a blank line."""
+    def _parse_alpha(self, args):
+        """Parse arguments ARGS for alpha command."""
+        name, alpha = args
+        objs = [self.cell.object(n) for n in self.expand_name(name)]
+        for obj in objs:
+            obj.alpha = float(alpha)
+        self.cell.changed(objs)
+
+    def _parse_animate(self, args):
+        """Parse arguments ARGS for animate command."""
+        name = args.pop(0)
+        x, y = self.expand_position(*args)
+        for n in self.expand_name(name):
+            self.cell.animate(n, x, y)
+
+    def _parse_attach(self, args):
+        """Parse arguments ARGS for attach command."""
+        name, parent, dx, dy = get_args(args, [None, None, 0., 0.])
+        dx, dy = self.expand_position(dx, dy)
+        objs = [self.cell.object(n) for n in self.expand_name(name)]
+        for obj in objs:
+            obj.attach(self.cell.object(parent), dx, dy)
+        self.cell.changed(objs)
+
+    def _parse_display(self, args):
+        """Parse arguments ARGS for display command."""
+        self.cell.display()
+
+    def _parse_end(self, args):
+        """Parse arguments ARGS for end command."""
+        self.abort("'end' without 'for', 'repeat', or 'bulk'")
+
+    def _parse_fade(self, args):
+        """Parse arguments ARGS for fade command."""
+        for n in self.expand_names(*args):
+            self.cell.fade(n)
+
+    def _parse_fix(self, args):
+        """Parse arguments ARGS for fix command."""
+        for n in self.expand_names(*args):
+            self.cell.fix(n)
+
+    def _parse_for(self, args):
+        """Parse arguments ARGS for for command.  Statements until the
+        matching end command are collected, and executed when the block is
+        closed."""
+        self.block = ['for ' + ' '.join(args), [], 1, False]
+
+    def _parse_hide(self, args):
+        """Parse arguments ARGS for hide command."""
+        for n in self.expand_names(*args):
+            self.cell.hide(n)
+
+    def _parse_kill(self, args):
+        """Parse arguments ARGS for kill command."""
+        for n in self.expand_names(*args, allow_nomatch=1):
+            # Links are deleted together with their nodes.
+            if self.cell.object(n):
+                self.cell.delete(n)
+
+    def _parse_layer(self, args):
+        """Parse arguments ARGS for layer command.  The layer '-' removes
+        objects from their layers."""
+        if len(args) < 2:
+            self.abort('usage: layer (layer|-) (name|regexp|@group)...')
+        layer, *args = args
+        layer = None if layer == '-' else str(layer)
+        for n in self.expand_names(*args):
+            self.cell.set_layer(n, layer)
+
+    def _parse_move(self, args):
+        """Parse arguments ARGS for move command."""
+        name = args.pop(0)
+        (x, y) = self.expand_position(*args)
+        objs = [self.cell.object(n) for n in self.expand_name(name)]
+        for obj in objs:
+            obj.move(x, y)
+        self.cell.changed(objs)
+
+    def _parse_play(self, args):
+        """Parse arguments ARGS for play command."""
+        file = args.pop(0)
+        if not os.path.exists(file):
+            self.abort("play: '{}' not found".format(file))
+        self.cell.monitor.play(file)
+
+    def _parse_priority(self, args):
+        """Parse arguments ARGS for priority command."""
+        name, level = args
+        for n in self.expand_name(name):
+            self.cell.set_priority(n, float(level))
+
+    def _parse_repeat(self, args):
+        """Parse arguments ARGS for repeat command.  Statements until the
+        matching end command are collected, and executed when the block is
+        closed."""
+        self.block = ['repeat ' + ' '.join(args), [], 1, False]
 
-        # Remove comment.
-        line = re.sub(r'^#.*', '', line)
+    def _parse_resize(self, args):
+        """Parse arguments ARGS for resize command."""
+        name = args.pop(0)
+        w, h = self.expand_position(*args)
+        objs = [self.cell.object(n) for n in self.expand_name(name)]
+        for obj in objs:
+            obj.resize(w, h)
+        self.cell.changed(objs)
+
+    def _parse_set(self, args):
+        """Parse arguments ARGS for set command."""
+        if len(args) < 2 or not VARIABLE_NAME_REGEXP.match(args[0]):
+            self.abort('usage: set var expression')
+        name, *expr = args
+        self.variables[name] = self.eval_expression(' '.join(expr))
+
+    def _parse_shift(self, args):
+        """Parse arguments ARGS for shift command."""
+        name, dx, dy = args
+        dx, dy = self.expand_position(dx, dy)
+        objs = [self.cell.object(n) for n in self.expand_name(name)]
+        for obj in objs:
+            obj.shift(dx, dy)
+        self.cell.changed(objs)
+
+    def _parse_sleep(self, args):
+        """Parse arguments ARGS for sleep command."""
+        secs = float(args.pop(0))
+        time.sleep(secs)
+
+    def _parse_unhide(self, args):
+        """Parse arguments ARGS for unhide command."""
+        for n in self.expand_names(*args):
+            self.cell.unhide(n)
+
+    def _parse_wait(self, args):
+        """Parse arguments ARGS for wait command."""
+        self.cell.wait()
+
+    def lookup_prefix(self, table, word):
+        """Return the entry in the prefix table TABLE matching WORD.  TABLE is
+        a list of (prefix, entry) pairs searched in order; the first entry
+        whose prefix WORD starts with is returned.  Results are memoized in
+        the dictionary attached to TABLE so that every word is resolved only
+        once."""
+        prefixes, resolved = table
+        entry = resolved.get(word, None)
+        if entry is not None:
+            return entry
+        for prefix, entry in prefixes:
+            if word.startswith(prefix):
+                resolved[word] = entry
+                return entry
+        return None
+
+    def register_command(self, prefix, handler):
+        """Register HANDLER as the handler for commands starting with PREFIX.
+        HANDLER is called with the list of arguments.  Registered commands
+        take precedence over built-in commands; e.g., a command registered
+        with prefix 'sw' is found before 'shift' or 'sleep'.  This allows
+        monitors and plugins to extend the CELL language."""
+        prefixes, resolved = self.command_table
+        prefixes.insert(0, (prefix, handler))
+        resolved.clear()
+        self.statement_cache.clear()
+
+    def lookup_command(self, cmd):
+        """Return the handler for (possibly abbreviated) command CMD.  Abort
+        the program execution if CMD is not a valid command."""
+        handler = self.lookup_prefix(self.command_table, cmd)
+        if not handler:
+            self.abort("illegal command '%s'", cmd)
+        return handler
+
+    def eval_expression(self, expr):
+        """Evaluate string EXPR as an integer expression, which may refer to
+        variables by their names, and return its value."""
+        if '$' in expr:
+            expr = self.interpolate(expr)
+        try:
+            return cellx.eval_integer(expr, self.variables)
+        except ValueError:
+            self.abort("invalid expression '{}'".format(expr))
+
+    def interpolate(self, astr, strict=True):
+        """Replace all references to variables in string ASTR with their
+        values, and return the result.  References to undefined variables
+        are left as they are unless STRICT is true."""
+        def replace(m):
+            name = m.group(1) or m.group(2)
+            if name is None:
+                return str(self.eval_expression(m.group(3)))
+            if name not in self.variables:
+                if not strict:
+                    return m.group(0)
+                self.abort("undefined variable '{}'".format(name))
+            return str(self.variables[name])
+
+        return VARIABLE_REGEXP.sub(replace, astr)
+
+    def block_command(self, line):
+        """Return the handler of the command in LINE if it opens or closes a
+        block (i.e., for, repeat, bulk, or end).  Otherwise, return None."""
+        words = line.split(None, 1)
+        if not words:
+            return None
+        handler = self.lookup_prefix(self.command_table, words[0].lower())
+        if handler in (self._parse_for, self._parse_repeat, self._parse_bulk,
+                       self._parse_end):
+            return handler
+        return None
+
+    def closes_bulk(self, line):
+        """Check if LINE closes bulk command, i.e., it is a single end
+        command.  Rows of bulk command always have more than one word."""
+        words = line.split()
+        return len(words) == 1 and self.lookup_prefix(
+            self.command_table, words[0].lower()) == self._parse_end
+
+    def block_nesting(self, line, in_bulk):
+        """Return the change of the nesting depth caused by statement LINE,
+        and whether the following lines are rows of bulk command.  IN_BULK
+        indicates whether LINE is a row of bulk command."""
+        if in_bulk:
+            if self.closes_bulk(line):
+                return -1, False
+            return 0, True
+        handler = self.block_command(line)
+        if handler == self._parse_end:
+            return -1, False
+        if handler:
+            return 1, handler == self._parse_bulk
+        return 0, False
+
+    def compile_block(self, lines):
+        """Compile the list of statements LINES into a list of closures.
+        Nested blocks are compiled recursively."""
+        program = []
+        i = 0
+        while i < len(lines):
+            handler = self.block_command(lines[i])
+            if handler == self._parse_end:
+                self.abort("'end' without 'for', 'repeat', or 'bulk'")
+            if handler:
+                # Find the matching end.
+                depth, in_bulk = 0, False
+                for j in range(i, len(lines)):
+                    delta, in_bulk = self.block_nesting(lines[j], in_bulk)
+                    depth += delta
+                    if depth == 0:
+                        break
+                program.append(self.compile_loop(lines[i], lines[i + 1:j]))
+                i = j + 1
+                continue
+            statement = self.compile_statement(lines[i])
+            if statement:
+                program.append(statement)
+            i += 1
+        return program
+
+    def compile_loop(self, header, lines):
+        """Compile a block starting with statement HEADER and having the list
+        of statements LINES as its body into a closure.  The body is compiled
+        only once and executed for every iteration.  The body of bulk command
+        is kept as rows, in which variables are substituted when executed."""
+        cmd, *args = split_words(header)
+        handler = self.lookup_prefix(self.command_table, cmd.lower())
+        if handler == self._parse_bulk:
+            apply = self.bulk_method(args)
+
+            def bulk():
+                apply([self.interpolate(row) if '$' in row else row
+                       for row in lines])
+
+            return bulk
+
+        body = self.compile_block(lines)
+        if handler == self._parse_repeat:
+            if len(args) != 1:
+                self.abort('usage: repeat count')
+
+            def loop():
+                for _ in range(self.eval_expression(args[0])):
+                    for statement in body:
+                        statement()
+
+            return loop
+
+        if len(args) not in (3, 4) or not VARIABLE_NAME_REGEXP.match(args[0]):
+            self.abort('usage: for var from to [step]')
+
+        def loop():
+            var, start, stop, *step = args
+            start = self.eval_expression(start)
+            stop = self.eval_expression(stop)
+            step = self.eval_expression(step[0]) if step else 1
+            if step == 0:
+                self.abort('step of for must not be zero')
+            # Both ends are inclusive.
+            for value in range(start, stop + (1 if step > 0 else -1), step):
+                self.variables[var] = value
+                for statement in body:
+                    statement()
+
+        return loop
+
+    def collect_block(self, line):
+        """Append statement LINE to the body of the loop being collected.
+        The loop is executed when its matching end is found."""
+        delta, self.block[3] = self.block_nesting(line, self.block[3])
+        self.block[2] += delta
+        if self.block[2] > 0:
+            self.block[1].append(line)
+            return
+        header, lines, depth, in_bulk = self.block
+        self.block = None
+        self.compile_loop(header, lines)()
+
+    def collect_row(self, line):
+        """Append LINE to the rows of bulk command being collected.  All rows
+        are applied at once when the line end is found."""
+        apply, rows = self.bulk
+        if not self.closes_bulk(line):
+            rows.append(line)
+            return
+        self.bulk = None
+        apply(rows)
+
+    def compile_statement(self, line):
+        """Compile a single statement LINE into a closure, which executes the
+        statement when called.  The closure holds the resolved command
+        handler and the arguments of the statement.  None is returned if
+        LINE is a comment or a blank line."""
+        # Ignore comment.
+        if line.startswith('#'):
+            return None
         # Remove indentation.
-        line = re.sub(r'^\s+', '', line)
+        line = line.lstrip()
         if not line:
-            return
+            return None
 
-        args = line.split()
+        args = split_words(line)
         cmd = args.pop(0).lower()
+        if '$' in cmd:
+            # The command itself is not known until executed.
+            return lambda: self.parse_single_line(self.interpolate(line))
         # Record the second argument (may be object name) for later reference.
         current_name = args[0] if args else None
+        handler = self.lookup_command(cmd)
 
-        if cmd.startswith('al'):  # alpha
-            name, alpha = args
-            for n in self.expand_name(name):
-                self.cell.object(n).alpha = float(alpha)
-        elif cmd.startswith('an'):  # animate
-            name = args.pop(0)
-            x, y = self.expand_position(*args)
-            for n in self.expand_name(name):
-                self.cell.animate(n, x, y)
-        elif cmd.startswith('at'):  # attach
-            name, parent, dx, dy = get_args(args, [None, None, 0., 0.])
-            dx, dy = self.expand_position(dx, dy)
-            for n in self.expand_name(name):
-                self.cell.object(n).attach(self.cell.object(parent), dx, dy)
-        elif cmd.startswith('c'):  # color
-            self._parse_color(args)
-        elif cmd.startswith('de'):  # define
-            self._parse_define(args)
-        elif cmd.startswith('di'):  # display
-            self.cell.display()
-        elif cmd.startswith('fa'):  # fade
-            for n in self.expand_names(*args):
-                self.cell.object(n).fade_out = True
-        elif cmd.startswith('fi'):  # fix
-            for n in self.expand_names(*args):
-                self.cell.object(n).fixed = True
-        elif cmd.startswith('h'):  # hide
-            for n in self.expand_names(*args):
-                self.cell.object(n).visible = 0
-        elif cmd.startswith('k'):  # kill
-            for n in self.expand_names(*args, allow_nomatch=1):
-                self.cell.delete(n)
-        elif cmd.startswith('m'):  # move
-            name = args.pop(0)
-            (x, y) = self.expand_position(*args)
-            for n in self.expand_name(name):
-                self.cell.object(n).move(x, y)
-        elif cmd.startswith('pa'):  # palette
-            self._parse_palette(args)
-        elif cmd.startswith('pl'):  # play
-            file = args.pop(0)
-            if not os.path.exists(file):
-                self.abort("play: '{}' not found".format(file))
-            self.cell.monitor.play(file)
-        elif cmd.startswith('pr'):  # priority
-            name, level = args
-            for n in self.expand_name(name):
-                self.cell.object(n).priority = float(level)
-        elif cmd.startswith('r'):  # resize
-            name = args.pop(0)
-            w, h = self.expand_position(*args)
-            for n in self.expand_name(name):
-                self.cell.object(n).resize(w, h)
-        elif cmd.startswith('sh'):  # shift
-            name, dx, dy = args
-            dx, dy = self.expand_position(dx, dy)
-            for n in self.expand_name(name):
-                self.cell.object(n).shift(dx, dy)
-        elif cmd.startswith('sl'):  # sleep
-            secs = float(args.pop(0))
-            time.sleep(secs)
-        elif cmd.startswith('sp'):  # spring
-            self._parse_spring(args)
-        elif cmd.startswith('u'):  # unhide
-            for n in self.expand_names(*args):
-                self.cell.object(n).visible = True
-        elif cmd.startswith('w'):  # wait
-            self.cell.wait()
-        else:
-            self.abort("illegal command '%s'", cmd)
+        if '$' in line:
+            # Variables are substituted every time the statement is executed.
+            # Arguments of a text object may contain $ literally, so only
+            # defined variables are substituted in them.
+            nstrict = len(args)
+            if handler == self._parse_define and len(args) > 1:
+                entry = self.lookup_prefix(self.define_table, args[1].lower())
+                if entry and entry[0] == self.define_text:
+                    nstrict = 2
+
+            def statement():
+                values = [
+                    self.interpolate(v, i < nstrict) if '$' in v else v
+                    for i, v in enumerate(args)
+                ]
+                handler(values)
+                if values and self.cell.object(values[0]):
+                    self.last_name = values[0]
 
-        if self.cell.object(current_name):
-            self.last_name = current_name
+            return statement
+
+        def statement():
+            # Handlers consume their arguments.
+            handler(list(args))
+            if self.cell.object(current_name):
+                self.last_name = current_name
+
+        return statement
+
+    def execute(self, handler, args):
+        """Execute a statement with command handler HANDLER and the list of
+        string arguments ARGS, which have already been split (e.g., from a
+        binary stream)."""
+        self.lineno += 1
+        # Converted to a string only when an error is reported.
+        self.line = args
+        handler(list(args))
+        name = args[0] if args else None
+        if self.cell.object(name):
+            self.last_name = name
+
+    def parse_single_line(self, line):
+        """Parse a sing line LINE, which can be either a simple statement, a
+        comment, or a blank line.  Compiled statements are cached so that
+        repeated statements are executed without being parsed again."""
+        if self.bulk:
+            self.collect_row(line)
+            return
+        if self.block:
+            self.collect_block(line)
+            return
+        cache = self.statement_cache
+        try:
+            statement = cache[line]
+            cache.move_to_end(line)
+            self.cache_hits += 1
+            self.miss_streak = 0
+        except KeyError:
+            statement = self.compile_statement(line)
+            self.cache_misses += 1
+            self.miss_streak += 1
+            # During a long run of misses (e.g., a trace with unique
+            # coordinates), only samples are cached, which end the run once
+            # statements start repeating.
+            if self.miss_streak <= self.statement_cache_size or \
+                self.miss_streak % CACHE_SAMPLE_INTERVAL == 0:
+                cache[line] = statement
+                if len(cache) > self.statement_cache_size:
+                    cache.popitem(last=False)
+        if statement:
+            statement()
 
     def parse_line(self, line):
         """Parse a line LINE written in the cell language.  LINE can have
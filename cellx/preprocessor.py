@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+#
+# C-like macro preprocessor for the cell language.
+# Copyright (c) 2018-2023, Hiroyuki Ohsaki.
+# All rights reserved.
+#
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import ast
+import collections
+import functools
+import os
+import re
+
+from perlcompat import die
+
+# Tokens of the preprocessor: comments, string literals, identifiers,
+# numbers, multi-character punctuators, white spaces, and any other single
+# characters.
+TOKEN_REGEXP = re.compile(r'''
+    /\*[\s\S]*?\*/ | //.*
+    | "(?:\\.|[^"\\])*" | '(?:\\.|[^'\\])*'
+    | [A-Za-z_]\w*
+    | \.?\d(?:[eEpP][+-]|[\w.])*
+    | \#\# | && | \|\| | == | != | <= | >= | << | >>
+    | \s+
+    | .
+''', re.VERBOSE)
+IDENT_REGEXP = re.compile(r'[A-Za-z_]\w*$')
+DIRECTIVE_REGEXP = re.compile(r'\s*#\s*(\w*)\s*(.*)', re.DOTALL)
+
+# The maximum number of lines whose expansions are memoized.
+MAX_MEMOIZED_LINES = 4096
+# The maximum depth of nested #include directives.
+MAX_INCLUDE_DEPTH = 200
+
+# Syntax tree nodes allowed in integer expressions.
+ALLOWED_NODES = (
+    ast.Expression, ast.Constant, ast.Name, ast.Load, ast.BinOp, ast.UnaryOp,
+    ast.BoolOp, ast.Compare, ast.Add, ast.Sub, ast.Mult, ast.FloorDiv,
+    ast.Mod, ast.LShift, ast.RShift, ast.BitAnd, ast.BitOr, ast.BitXor,
+    ast.UAdd, ast.USub, ast.Invert, ast.Not, ast.And, ast.Or, ast.Eq,
+    ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+# The maximum number of bits of values of left shifts and multiplications
+# in integer expressions, which would otherwise exhaust the memory.
+MAX_INTEGER_BITS = 4096
+# Translation of C operators in #if expressions into Python.
+C_OPERATORS = {'&&': ' and ', '||': ' or ', '!': ' not ', '/': '//'}
+
+def tokenize(line):
+    """Split string LINE into a list of preprocessor tokens.  Comments are
+    replaced with a single space."""
+    tokens = TOKEN_REGEXP.findall(line)
+    return [' ' if t.startswith(('/*', '//')) else t for t in tokens]
+
+def _skip_space(tokens, i):
+    while i < len(tokens) and tokens[i].isspace():
+        i += 1
+    return i
+
+def _strip_space(tokens):
+    i = _skip_space(tokens, 0)
+    j = len(tokens)
+    while j > i and tokens[j - 1].isspace():
+        j -= 1
+    return tokens[i:j]
+
+def _lshift(a, b):
+    if b > 0 and int(a).bit_length() + b > MAX_INTEGER_BITS:
+        raise ValueError('integer too large')
+    return a << b
+
+def _mul(a, b):
+    if int(a).bit_length() + int(b).bit_length() > MAX_INTEGER_BITS:
+        raise ValueError('integer too large')
+    return a * b
+
+# Functions performing operators whose values are bounded, which are the
+# only globals of integer expressions.
+BOUNDED_OPERATORS = {ast.LShift: '__lshift', ast.Mult: '__mul'}
+BOUNDED_FUNCTIONS = {
+    '__builtins__': {},
+    '__lshift': _lshift,
+    '__mul': _mul
+}
+
+class _BoundOperators(ast.NodeTransformer):
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        name = BOUNDED_OPERATORS.get(type(node.op), None)
+        if name is None:
+            return node
+        return ast.Call(func=ast.Name(id=name, ctx=ast.Load()),
+                        args=[node.left, node.right],
+                        keywords=[])
+
+@functools.lru_cache(maxsize=4096)
+def _compile_expression(expr):
+    """Compile string EXPR into a code object after checking that it only
+    contains integer constants, names, and allowed operators.  Names
+    starting with __ are reserved for bounded functions, which replace left
+    shifts and multiplications."""
+    tree = ast.parse(expr.strip(), mode='eval')
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES) or \
+            (isinstance(node, ast.Constant) and type(node.value) != int) or \
+            (isinstance(node, ast.Name) and node.id.startswith('__')):
+            raise ValueError('unsupported expression')
+    tree = ast.fix_missing_locations(_BoundOperators().visit(tree))
+    return compile(tree, '<expression>', 'eval')
+
+def eval_integer(expr, variables=None):
+    """Evaluate string EXPR as an integer expression in the Python syntax,
+    and return its value.  Only integer constants, names in dictionary
+    VARIABLES, and arithmetic, bitwise, logical, and comparison operators are
+    allowed.  ValueError is raised if EXPR is invalid or its value has more
+    than MAX_INTEGER_BITS bits."""
+    try:
+        code = _compile_expression(expr)
+        return int(eval(code, BOUNDED_FUNCTIONS, variables or {}))
+    except (SyntaxError, ArithmeticError, NameError, RecursionError,
+            TypeError, ValueError) as e:
+        raise ValueError(str(e))
+
+# A macro.  PARAMS is the list of parameter names, or None if the macro is
+# object-like.  BODY is the list of tokens of the replacement.
+Macro = collections.namedtuple('Macro', ['params', 'body'])
+
+class Preprocessor:
+    def __init__(self, include_dirs=None):
+        self.include_dirs = include_dirs or []
+        self.macros = {}
+        # Memoized expansions: line -> expanded line.  Cleared whenever a
+        # macro is defined or undefined.
+        self.expansion_cache = collections.OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Stack of conditionals: [(active, taken), ...].
+        self.conditionals = []
+        self.include_depth = 0
+        self.filename = '<stdin>'
+        self.lineno = 0
+
+    def abort(self, msg):
+        """Abort the execution after displaying error message MSG with the
+        current file name and line number."""
+        die(f'{self.filename}:{self.lineno}: {msg}')
+
+    def define(self, name, body='', params=None):
+        """Define macro NAME replaced with string BODY.  PARAMS is the list
+        of parameter names if the macro is function-like."""
+        self.macros[name] = Macro(params, _strip_space(tokenize(body)))
+        self.expansion_cache.clear()
+
+    def undef(self, name):
+        """Undefine macro NAME if defined."""
+        self.macros.pop(name, None)
+        self.expansion_cache.clear()
+
+    def active(self):
+        """Return True if lines are not skipped by conditionals."""
+        return not self.conditionals or self.conditionals[-1][0]
+
+    def _collect_args(self, tokens, i):
+        """Collect arguments of a macro invocation, which start with the
+        opening parenthesis at TOKENS[I].  Return the list of arguments and
+        the index just after the closing parenthesis."""
+        args = [[]]
+        depth = 0
+        for j in range(i + 1, len(tokens)):
+            t = tokens[j]
+            if t == '(':
+                depth += 1
+            elif t == ')':
+                if depth == 0:
+                    return [_strip_space(arg) for arg in args], j + 1
+                depth -= 1
+            elif t == ',' and depth == 0:
+                args.append([])
+                continue
+            args[-1].append(t)
+        self.abort('unterminated argument list')
+
+    def _substitute(self, macro, args, disabled):
+        """Substitute parameters in the body of function-like macro MACRO
+        with arguments ARGS, and return the list of tokens.  Arguments are
+        expanded unless stringized with # or pasted with ##."""
+        params = {name: i for i, name in enumerate(macro.params)}
+        body = macro.body
+        result = []
+        k = 0
+        while k < len(body):
+            t = body[k]
+            if t == '#':
+                n = _skip_space(body, k + 1)
+                if n < len(body) and body[n] in params:
+                    arg = ''.join(args[params[body[n]]])
+                    result.append('"' + arg.replace('\\', '\\\\').replace(
+                        '"', '\\"') + '"')
+                    k = n + 1
+                    continue
+            if t == '##':
+                while result and result[-1].isspace():
+                    result.pop()
+                k = _skip_space(body, k + 1)
+                if k >= len(body):
+                    break
+                right = body[k]
+                right = args[params[right]] if right in params else [right]
+                if result and right:
+                    result[-1] += right[0]
+                    result.extend(right[1:])
+                else:
+                    result.extend(right)
+                k += 1
+                continue
+            if t in params:
+                arg = args[params[t]]
+                n = _skip_space(body, k + 1)
+                if n < len(body) and body[n] == '##':
+                    result.extend(arg)
+                else:
+                    result.extend(self.expand_tokens(arg, disabled))
+            else:
+                result.append(t)
+            k += 1
+        return result
+
+    def expand_tokens(self, tokens, disabled=frozenset()):
+        """Expand all macros in the list of tokens TOKENS, and return the
+        list of resulting tokens.  Macros in set DISABLED are not expanded
+        to prevent infinite recursion."""
+        macros = self.macros
+        result = []
+        i = 0
+        while i < len(tokens):
+            t = tokens[i]
+            macro = macros.get(t, None)
+            if macro is None or t in disabled:
+                result.append(t)
+                i += 1
+                continue
+            if macro.params is None:
+                result.extend(self.expand_tokens(macro.body, disabled | {t}))
+                i += 1
+                continue
+            # Function-like macros are expanded only if followed by an
+            # argument list.
+            j = _skip_space(tokens, i + 1)
+            if j >= len(tokens) or tokens[j] != '(':
+                result.append(t)
+                i += 1
+                continue
+            args, i = self._collect_args(tokens, j)
+            if args == [[]] and not macro.params:
+                args = []
+            if len(args) != len(macro.params):
+                self.abort(f"macro '{t}' requires {len(macro.params)} "
+                           f'arguments, but {len(args)} given')
+            body = self._substitute(macro, args, disabled)
+            result.extend(self.expand_tokens(body, disabled | {t}))
+        return result
+
+    def expand(self, line):
+        """Expand all macros in string LINE, and return the expanded line.
+        Expansions are memoized until any macro is redefined."""
+        if not self.macros and '/*' not in line and '//' not in line:
+            return line
+        cache = self.expansion_cache
+        try:
+            expanded = cache[line]
+            cache.move_to_end(line)
+            self.cache_hits += 1
+        except KeyError:
+            expanded = ''.join(self.expand_tokens(tokenize(line)))
+            cache[line] = expanded
+            if len(cache) > MAX_MEMOIZED_LINES:
+                cache.popitem(last=False)
+            self.cache_misses += 1
+        return expanded
+
+    def evaluate(self, expr):
+        """Evaluate string EXPR as the integer expression of #if directive,
+        and return its value."""
+        tokens = tokenize(expr)
+        # Replace defined(NAME) and defined NAME before macro expansion.
+        replaced = []
+        i = 0
+        while i < len(tokens):
+            if tokens[i] == 'defined':
+                j = _skip_space(tokens, i + 1)
+                paren = j < len(tokens) and tokens[j] == '('
+                if paren:
+                    j = _skip_space(tokens, j + 1)
+                if j >= len(tokens) or not IDENT_REGEXP.match(tokens[j]):
+                    self.abort("invalid use of 'defined'")
+                replaced.append('1' if tokens[j] in self.macros else '0')
+                i = j + 1
+                if paren:
+                    i = _skip_space(tokens, i)
+                    if i >= len(tokens) or tokens[i] != ')':
+                        self.abort("missing ')' after 'defined'")
+                    i += 1
+            else:
+                replaced.append(tokens[i])
+                i += 1
+        # Undefined identifiers evaluate to zero.
+        astr = ''
+        for t in self.expand_tokens(replaced):
+            if IDENT_REGEXP.match(t):
+                t = '0'
+            elif t[0].isdigit():
+                t = str(int(t.rstrip('uUlL'), 0))
+            astr += C_OPERATORS.get(t, t)
+        try:
+            return eval_integer(astr)
+        except ValueError:
+            self.abort(f'invalid expression in #if: {expr.strip()}')
+
+    def include(self, name):
+        """Process the file included with #include directive NAME, and
+        return the generator of its expanded lines."""
+        m = re.match(r'"([^"]+)"|<([^>]+)>', name)
+        if not m:
+            self.abort(f'invalid #include: {name}')
+        file = m.group(1) or m.group(2)
+        dirs = self.include_dirs
+        # Files included with quotes are first searched in the directory of
+        # the current file.
+        if m.group(1):
+            dirs = [os.path.dirname(self.filename)] + dirs
+        for d in dirs:
+            path = os.path.join(d, file)
+            if os.path.isfile(path):
+                break
+        else:
+            self.abort(f'cannot find included file: {file}')
+        if self.include_depth >= MAX_INCLUDE_DEPTH:
+            self.abort('#include nested too deeply')
+        saved = self.filename, self.lineno
+        self.include_depth += 1
+        with open(path) as f:
+            yield from self.process(f, path)
+        self.include_depth -= 1
+        self.filename, self.lineno = saved
+
+    def directive(self, name, args):
+        """Process directive NAME with arguments ARGS.  Return the generator
+        of lines produced by the directive."""
+        if name in ('if', 'ifdef', 'ifndef'):
+            if not self.active():
+                # Skip nested conditionals entirely.
+                self.conditionals.append((False, True))
+            elif name == 'if':
+                value = bool(self.evaluate(args))
+                self.conditionals.append((value, value))
+            else:
+                value = (args.split() or [''])[0] in self.macros
+                if name == 'ifndef':
+                    value = not value
+                self.conditionals.append((value, value))
+        elif name in ('elif', 'else'):
+            if not self.conditionals:
+                self.abort(f'#{name} without #if')
+            active, taken = self.conditionals.pop()
+            outer = self.active()
+            if taken or not outer:
+                value = False
+            elif name == 'elif':
+                value = bool(self.evaluate(args))
+            else:
+                value = True
+            self.conditionals.append((value, taken or value))
+        elif name == 'endif':
+            if not self.conditionals:
+                self.abort('#endif without #if')
+            self.conditionals.pop()
+        elif not self.active():
+            pass
+        elif name == 'define':
+            m = re.match(r'([A-Za-z_]\w*)(\(([^)]*)\))?\s*(.*)', args,
+                         re.DOTALL)
+            if not m:
+                self.abort(f'invalid macro name: {args}')
+            params = None
+            if m.group(2):
+                params = [p.strip() for p in m.group(3).split(',')]
+                if params == ['']:
+                    params = []
+            self.define(m.group(1), m.group(4), params)
+        elif name == 'undef':
+            self.undef(args.strip())
+        elif name == 'include':
+            return self.include(self.expand(args).strip())
+        elif name == 'error':
+            self.abort(f'#error {args.strip()}')
+        # Other directives are ignored as comments.
+        return ()
+
+    def process(self, lines, filename='<stdin>'):
+        """Preprocess iterable LINES read from file FILENAME, and return the
+        generator of expanded lines.  Lines are joined with backslashes at
+        their ends, and comments spanning lines are removed."""
+        self.filename, self.lineno = filename, 0
+        buf = ''
+        for line in lines:
+            self.lineno += 1
+            line = line.rstrip('\r\n')
+            if line.endswith('\\'):
+                buf += line[:-1]
+                continue
+            line = buf + line
+            # Join lines until comments are closed.
+            if '/*' in line and not self._closed(line):
+                buf = line + '\n'
+                continue
+            buf = ''
+            yield from self._process_line(line)
+        if buf:
+            if not self._closed(buf):
+                self.abort('unterminated comment')
+            yield from self._process_line(buf)
+        if self.include_depth == 0 and self.conditionals:
+            self.abort('unterminated conditional')
+
+    def _process_line(self, line):
+        """Process joined line LINE, and return the iterable of expanded
+        lines."""
+        m = DIRECTIVE_REGEXP.match(line)
+        if m:
+            return self.directive(m.group(1), m.group(2))
+        elif self.active():
+            return [self.expand(line).replace('\n', ' ')]
+        return ()
+
+    def _closed(self, line):
+        """Check if all comments in LINE are closed.  An unclosed comment is
+        split into '/' and '*' tokens by the tokenizer."""
+        tokens = tokenize(line)
+        return not any(t == '/' and u == '*'
+                       for t, u in zip(tokens, tokens[1:]))
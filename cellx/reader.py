@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+#
+# Buffered reader of possibly-compressed input files.
+# Copyright (c) 2018-2023, Hiroyuki Ohsaki.
+# All rights reserved.
+#
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import bz2
+import codecs
+import gzip
+import lzma
+import os
+import sys
+import time
+
+# The number of bytes read at once.
+BLOCK_SIZE = 1 << 20
+
+# Decompressors identified by file name extensions and magic bytes.
+EXTENSIONS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+    '.lzma': lzma.open,
+}
+MAGICS = [
+    (b'\x1f\x8b', gzip.open),
+    (b'BZh', bz2.open),
+    (b'\xfd7zXZ\x00', lzma.open),
+]
+
+def open_input(file):
+    """Open file FILE for reading in binary mode, and return the stream.  If
+    FILE is '-', the standard input is used.  Compressed files (gzip, bzip2,
+    and xz) are identified by their extensions or magic bytes, and
+    decompressed on the fly."""
+    if file == '-':
+        stream = sys.stdin.buffer
+    else:
+        stream = open(file, 'rb', buffering=BLOCK_SIZE)
+    opener = EXTENSIONS.get(os.path.splitext(file)[1], None)
+    if opener is None:
+        head = stream.peek(6)
+        for magic, func in MAGICS:
+            if head.startswith(magic):
+                opener = func
+                break
+    if opener is None:
+        return stream
+    if stream is sys.stdin.buffer:
+        return opener(stream)
+    # Let the decompressor own the file so that both are closed together.
+    stream.close()
+    return opener(file)
+
+class LineReader:
+    def __init__(self,
+                 stream,
+                 block_size=BLOCK_SIZE,
+                 encoding='utf-8',
+                 head=b''):
+        """Create a reader splitting binary stream STREAM into lines.  STREAM
+        is read in blocks of at most BLOCK_SIZE bytes and decoded with
+        ENCODING.  HEAD is the bytes at the beginning of the stream if they
+        have already been read.  The number of bytes read and the time spent
+        in reading are recorded."""
+        self.stream = stream
+        self.head = head
+        self.block_size = block_size
+        self.encoding = encoding
+        self.nbytes = 0
+        self.elapsed = 0.
+
+    def __iter__(self):
+        """Return the generator of lines without trailing newlines.  Lines
+        are generated as soon as they are available, so that a stream being
+        written (e.g., a pipe) is processed live."""
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+        rest = ''
+        head = self.head
+        while True:
+            start = time.perf_counter()
+            block = head or self.stream.read1(self.block_size)
+            head = b''
+            self.nbytes += len(block)
+            if not block:
+                break
+            lines = (rest + decoder.decode(block)).split('\n')
+            rest = lines.pop()
+            self.elapsed += time.perf_counter() - start
+            yield from lines
+        rest += decoder.decode(b'', final=True)
+        self.elapsed += time.perf_counter() - start
+        if rest:
+            yield rest
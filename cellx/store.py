@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+#
+# Columnar storage of cell objects.
+# Copyright (c) 2018-2023, Hiroyuki Ohsaki.
+# All rights reserved.
+#
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import weakref
+
+import numpy
+
+from cellx.object import ObjectBase
+
+# Numeric attributes stored as float64 columns.  None is stored as NaN.
+COLUMNS = ('x', 'y', 'width', 'height', 'alpha', 'priority', 'goal_x',
+           'goal_y', 'velocity')
+
+# Attributes kept in every view.
+SLOTS = ('id_', 'name', 'frame_color', 'fixed', 'layer', 'visible',
+         'fade_out', 'n', 'rotation', 'text', 'size', 'align', '_text_cache',
+         'file', '_bitmap_cache', 'x2', 'y2', 'x3', 'y3', 'parent', 'children',
+         'src', 'dst', 'groups')
+
+NO_GROUPS = frozenset()
+
+# Bidirectional mapping between values and small integer codes.
+class Codes:
+    def __init__(self, values=()):
+        self.values = []
+        self.codes = {}
+        for value in values:
+            self.code(value)
+
+    def code(self, value):
+        """Return the code for VALUE.  A new code is assigned if VALUE has
+        never been seen."""
+        code = self.codes.get(value, None)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def value(self, code):
+        """Return the value for code CODE."""
+        return self.values[code]
+
+# Codes are shared by all stores so that rows can be compared across stores.
+TYPE_CODES = Codes([None, 'bitmap', 'box', 'ellipse', 'line', 'link',
+                    'polygon', 'spline', 'text', 'wire'])
+COLOR_CODES = Codes([None])
+
+def _column_property(column):
+    def fget(self):
+        v = getattr(self._store, column)[self._index]
+        # NaN represents None.
+        return None if v != v else float(v)
+
+    def fset(self, v):
+        getattr(self._store, column)[self._index] = numpy.nan if v is None else v
+
+    return property(fget, fset)
+
+def _code_property(column, codes):
+    def fget(self):
+        return codes.value(getattr(self._store, column)[self._index])
+
+    def fset(self, v):
+        getattr(self._store, column)[self._index] = codes.code(v)
+
+    return property(fget, fset)
+
+# Lightweight cell object whose numeric attributes, type and color are
+# stored in row _INDEX of object store _STORE.
+class ObjectView(ObjectBase):
+    __slots__ = ('_store', '_index', '__weakref__') + SLOTS
+
+    type_ = _code_property('type_code', TYPE_CODES)
+    color = _code_property('color_code', COLOR_CODES)
+
+for _column in COLUMNS:
+    setattr(ObjectView, _column, _column_property(_column))
+
+# Struct-of-arrays storage of cell objects.
+class ObjectStore:
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        # The number of rows ever allocated.
+        self.size = 0
+        # Rows available for reuse.
+        self.free = []
+        for column in COLUMNS:
+            setattr(self, column, numpy.full(capacity, numpy.nan))
+        self.type_code = numpy.zeros(capacity, dtype=numpy.int8)
+        self.color_code = numpy.zeros(capacity, dtype=numpy.int32)
+
+    def _grow(self):
+        """Double the capacity of all columns."""
+        capacity = self.capacity * 2
+        for column in COLUMNS:
+            array = numpy.full(capacity, numpy.nan)
+            array[:self.capacity] = getattr(self, column)
+            setattr(self, column, array)
+        for column in ('type_code', 'color_code'):
+            old = getattr(self, column)
+            array = numpy.zeros(capacity, dtype=old.dtype)
+            array[:self.capacity] = old
+            setattr(self, column, array)
+        self.capacity = capacity
+
+    def allocate(self):
+        """Allocate a row and return its index."""
+        if self.free:
+            return self.free.pop()
+        if self.size == self.capacity:
+            self._grow()
+        self.size += 1
+        return self.size - 1
+
+    def adopt(self, obj):
+        """Copy all attributes of cell object OBJ into a newly allocated row,
+        and return the view of the row."""
+        view = ObjectView()
+        view._store = self
+        view._index = self.allocate()
+        for column in COLUMNS:
+            setattr(view, column, getattr(obj, column))
+        view.type_ = obj.type_
+        view.color = obj.color
+        for attr in SLOTS:
+            setattr(view, attr, getattr(obj, attr))
+        # Empty containers are not kept per object.
+        view.children = obj.children or ()
+        view._text_cache = obj._text_cache or None
+        view.groups = obj.groups or NO_GROUPS
+        for child in view.children:
+            child.parent = view
+        return view
+
+    def release(self, view):
+        """Release the row of VIEW.  The row is reused only after VIEW is
+        garbage-collected, so references to deleted objects (e.g., a parent
+        of an attached object) remain valid."""
+        weakref.finalize(view, self.free.append, view._index)
+
+    def indices(self, views):
+        """Return the array of row indices of all views in VIEWS."""
+        return numpy.fromiter((view._index for view in views),
+                              dtype=numpy.intp,
+                              count=len(views))
+
+    def nbytes(self):
+        """Return the number of bytes used by all columns."""
+        return sum(
+            getattr(self, column).nbytes
+            for column in COLUMNS + ('type_code', 'color_code'))
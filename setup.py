@@ -16,7 +16,7 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/h-ohsaki/cellx",
     packages=setuptools.find_packages(),
-    install_requires=['pygame', 'PyOpenGL'],
+    install_requires=['numpy', 'pygame', 'PyOpenGL'],
     scripts=['bin/cellx'],
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+#
+# Tests of the binary encoding of the cell language.
+# Copyright (c) 2018-2023, Hiroyuki Ohsaki.
+# All rights reserved.
+#
+
+import glob
+import io
+import os
+
+import pytest
+
+import cellx
+import cellx.object
+
+EXAMPLES = sorted(
+    glob.glob(os.path.join(os.path.dirname(__file__), '..', 'ex', '*.scl')))
+
+# Examples referring to missing files, or failing even in the text form.
+SKIPPED = ('05_bitmap.scl', '17_spring.scl', '20_sound.scl')
+
+ATTRIBUTES = ('type_', 'x', 'y', 'width', 'height', 'color', 'alpha',
+              'priority', 'visible', 'text', 'x2', 'y2')
+
+def run(lines, binary=False):
+    """Execute LINES in the text form or the binary form, and return the
+    attributes of all objects."""
+    # Automatically-generated names depend on the number of objects.
+    cellx.object.max_id = 0
+    cell = cellx.Cell(monitor=cellx.monitor.Null(), rate_limit=0)
+    parser = cellx.Parser(cell=cell)
+    if binary:
+        stream = io.BytesIO()
+        encoder = cellx.Encoder(stream)
+        for line in lines:
+            encoder.write_line(line)
+        stream.seek(0)
+        cellx.run_binary(parser, stream)
+    else:
+        for line in lines:
+            parser.parse_line(line)
+    return {
+        obj.name: [getattr(obj, attr) for attr in ATTRIBUTES]
+        for obj in cell.all_objects()
+    }
+
+@pytest.mark.parametrize('file', EXAMPLES, ids=os.path.basename)
+def test_examples(file, monkeypatch):
+    if os.path.basename(file) in SKIPPED:
+        pytest.skip('refers to missing files or fails in the text form')
+    monkeypatch.chdir(os.path.dirname(file))
+    with open(file) as f:
+        lines = f.read().splitlines()
+    assert run(lines, binary=True) == run(lines)
+
+def test_exact_arguments():
+    lines = [
+        'define 1 box', 'move 1 10 10', 'define v ellipse', 'color v red 0',
+        'define w box 007 +5 red 0.1 1e-1', 'move w 123.456 -0.050',
+        'define x box 10.500 -0.0 blue 0.25 00.5'
+    ]
+    assert run(lines, binary=True) == run(lines)
+
+def test_opcodes():
+    names = [name for prefix, name in cellx.parser.COMMANDS]
+    assert sorted(cellx.OPCODES) == sorted(names)
+    assert len(set(cellx.OPCODES.values())) == len(names)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+#
+# Tests of cell objects driven by the cell language.
+# Copyright (c) 2018-2023, Hiroyuki Ohsaki.
+# All rights reserved.
+#
+
+import pytest
+
+import cellx
+
+def run(lines, columnar=False, **kwargs):
+    """Execute LINES with the Null monitor, and return the cell."""
+    cell = cellx.Cell(monitor=cellx.monitor.Null(),
+                      rate_limit=0,
+                      columnar=columnar,
+                      **kwargs)
+    parser = cellx.Parser(cell=cell)
+    for line in lines:
+        parser.parse_line(line)
+    return cell
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_status_unchanged_by_regexp(columnar):
+    cell = run(['define a box', 'display', 'color /./ red', 'display'],
+               columnar)
+    status = cell.object('_status')
+    assert cell.object('a').color == 'red'
+    assert (status.color, status.visible, status.x) == ('white', True, 96)
+
+def test_regexp_in_order_of_definition():
+    cell = run(['define v2 box', 'define v10 box', 'define w1 box',
+                'define v1 box', 'color /^v/ red', 'color /1$/ blue'])
+    assert cell.names_matching('^v') == ['v2', 'v10', 'v1']
+    assert [cell.object(n).color for n in ['v2', 'v10', 'w1', 'v1']] == \
+        ['red', 'red', 'blue', 'blue']
+
+def test_regexp_after_kill_and_define():
+    cell = run(['define v2 box', 'define v10 box', 'define v1 box',
+                'color /^v/ red', 'kill /^v1/', 'define v3 box',
+                'color /^v/ blue'])
+    assert cell.object('v10') is None and cell.object('v1') is None
+    assert cell.names_matching('^v') == ['v2', 'v3']
+    assert cell.object('v2').color == 'blue'
+
+def test_group_selection():
+    cell = run(['define a box -g g1,g2', 'define b[1..3] box -g g1',
+                'define c box', 'color @g1 red', 'hide @g2', 'kill b2',
+                'move @g1 100 200'])
+    assert cell.group_members('g1') == ['a', 'b1', 'b3']
+    assert cell.group_members('g2') == ['a']
+    assert [cell.object(n).color for n in ['a', 'b1', 'b3', 'c']] == \
+        ['red', 'red', 'red', 'white']
+    assert not cell.object('a').visible and cell.object('b1').visible
+    assert (cell.object('b3').x, cell.object('b3').y) == (100, 200)
+    assert cell.object('c').x != 100
+
+def test_empty_group():
+    with pytest.raises(SystemExit):
+        run(['define a box -g g1', 'kill a', 'color @g1 red'])
+
+def test_links_of_nodes():
+    cell = run(['define a box', 'define b box', 'define c box',
+                'define l1 link a b', 'define l2 link b c',
+                'define l3 link c a', 'kill c', 'define c box',
+                'define l4 link a c'])
+    assert cell.object('l2') is None and cell.object('l3') is None
+    assert [link.name for link in cell.links_of('a')] == ['l1', 'l4']
+    assert [link.name for link in cell.links_of('c')] == ['l4']
+    assert [link.name for link in cell.links_touching(['b', 'c'])] == \
+        ['l1', 'l4']
+
+def test_links_of_redefined_node():
+    cell = run(['define a box', 'define b box', 'define l1 link a b',
+                'define a ellipse 10 10'])
+    assert cell.object('l1').src is cell.object('a')
+    assert [link.name for link in cell.links_of('a')] == ['l1']
+
+GRAPH = ['define a box', 'define b box', 'define c box', 'define l1 link a b']
+
+def test_layout_cache_hit():
+    cell = run(GRAPH + ['spring -f builtin a b c'])
+    x, y = cell.object('a').x, cell.object('a').y
+    cell = run(GRAPH + [
+        'spring -f builtin a b c', 'move a 0 0', 'spring -f builtin c b a'
+    ])
+    assert (cell.layout_cache_hits, cell.layout_cache_misses) == (1, 1)
+    assert (cell.object('a').x, cell.object('a').y) == (x, y)
+
+def test_layout_cache_invalidated_by_links():
+    cell = run(GRAPH + [
+        'spring -f builtin a b c', 'define l2 link b c',
+        'spring -f builtin a b c', 'kill l2', 'spring -f builtin a b c'
+    ])
+    assert (cell.layout_cache_hits, cell.layout_cache_misses) == (1, 2)
+
+def test_layout_cache_on_disk(tmp_path):
+    first = run(GRAPH + ['spring -f builtin a b c'], layout_cache_dir=tmp_path)
+    assert len(list(tmp_path.glob('*.json'))) == 1
+    cell = run(GRAPH + ['spring -f builtin a b c'], layout_cache_dir=tmp_path)
+    assert (cell.layout_cache_hits, cell.layout_cache_misses) == (1, 0)
+    assert [cell.object(n).x for n in 'abc'] == \
+        [first.object(n).x for n in 'abc']
+
+def test_range_with_positions(tmp_path):
+    path = tmp_path / 'positions'
+    path.write_text('# x y\n10 20\n30 40\n50 60\n')
+    cell = run(['define v[1..3] box -g g -P {} 10 10 red'.format(path)])
+    assert cell.object('v4') is None
+    assert [(cell.object(n).x, cell.object(n).y, cell.object(n).color)
+            for n in ['v1', 'v2', 'v3']] == \
+        [(10, 20, 'red'), (30, 40, 'red'), (50, 60, 'red')]
+    assert cell.group_members('g') == ['v1', 'v2', 'v3']
+
+@pytest.mark.parametrize('positions', ['10 20\n', '10 20\n30 40\nx y\n'])
+def test_range_with_wrong_positions(tmp_path, positions):
+    path = tmp_path / 'positions'
+    path.write_text(positions)
+    with pytest.raises(SystemExit):
+        run(['define v[1..2] box -P {}'.format(path)])
+
+def test_range_with_arrowheads():
+    cell = run(['define w[0..1] line -h 1 2 3 4'])
+    assert sorted(name for name in cell.objects if name.startswith('w')) == \
+        ['w0', 'w0_head', 'w1', 'w1_head']
+
+def test_bulk_blocks():
+    cell = run([
+        'define a box', 'define b box', 'define c box', 'bulk move',
+        'a 100 200', 'b a+10-20', 'en', 'bulk color', 'a red', 'c blue 128',
+        'END', 'bulk animate', 'c 300 400', 'end'
+    ])
+    a, b, c = cell.object('a'), cell.object('b'), cell.object('c')
+    assert (a.x, a.y, a.color) == (100, 200, 'red')
+    # Rows are applied at once, so a is referred at its previous position.
+    assert (b.x, b.y, b.color) == (410, 280, 'white')
+    assert (c.color, c.alpha, c.goal_x, c.goal_y) == ('blue', 128, 300, 400)
+    assert c in cell.moving
+
+def test_bulk_in_loop():
+    cell = run(['define a box', 'for i 1 2', 'bulk move', 'a $i 5', 'end',
+                'end'])
+    assert (cell.object('a').x, cell.object('a').y) == (2, 5)
+
+@pytest.mark.parametrize('row', ['z 1 2', 'a 1', 'a z+1+2', 'a 1 2 3'])
+def test_bulk_invalid_row(row):
+    with pytest.raises(SystemExit):
+        run(['define a box', 'bulk move', row, 'end'])
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_render_order(columnar):
+    cell = run([
+        'define a box', 'define b box', 'define c box', 'define d box',
+        'define e box', 'priority b 5', 'priority a 5', 'priority d -1',
+        'hide c', 'define e box', 'unhide c', 'priority c 5',
+        'define b ellipse 1 1', 'kill a', 'define a box', 'display'
+    ], columnar)
+    # Objects of the same priority are rendered in the order of definition,
+    # where an object redefined without being killed keeps its place.
+    assert [obj.name for obj in cell.render_list()
+            if obj.name != '_status'] == ['d', 'b', 'e', 'a', 'c']
+
+def test_loops_and_variables():
+    cell = run([
+        'set n 3', 'for i 1 n', 'define v$i box', 'move v$i $(i*100) ${i}0',
+        'end', 'set k n*2', 'repeat 2', 'set k k+1', 'end',
+        'for j 3 1 -2', 'color v$j red', 'end', 'define t text $k-$undefined'
+    ])
+    assert [(cell.object(n).x, cell.object(n).y, cell.object(n).color)
+            for n in ['v1', 'v2', 'v3']] == \
+        [(100, 10, 'red'), (200, 20, 'white'), (300, 30, 'red')]
+    # Undefined variables are left as-is in strings.
+    assert cell.object('t').text == '8-$undefined'
+
+@pytest.mark.parametrize('lines', [['move $x 1 2'], ['set __x 1'], ['end'],
+                                   ['set x 1', 'move $(x +) 1 2']])
+def test_invalid_variables(lines):
+    with pytest.raises(SystemExit):
+        run(['define x box'] + lines)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+#
+# Tests of the macro preprocessor.
+# Copyright (c) 2018-2023, Hiroyuki Ohsaki.
+# All rights reserved.
+#
+
+import pytest
+
+import cellx
+
+def process(lines):
+    return [line.split() for line in cellx.Preprocessor().process(lines)]
+
+def test_comments_without_macros():
+    assert process(['box 1 // comment', 'a /* b */ c']) == [['box', '1'], ['a', 'c']]
+
+def test_comments_spanning_lines_without_macros():
+    assert process(['a /* b', 'c */ d']) == [['a', 'd']]
+
+def test_continuation_at_end_without_macros():
+    assert process(['a // b \\']) == [['a']]
+
+def test_comments_with_macros():
+    assert process(['#define N 10', 'box N // N']) == [['box', '10']]
+
+def test_integer_size_is_bounded():
+    assert cellx.eval_integer('1 << 100') == 1 << 100
+    with pytest.raises(ValueError):
+        cellx.eval_integer('1 << 10000000000')
+    with pytest.raises(ValueError):
+        cellx.eval_integer('(1 << 4000) * (1 << 4000)')
+
+@pytest.mark.parametrize('expr', ['__builtins__', '__mul', '__mul(2, 3)'])
+def test_reserved_names(expr):
+    with pytest.raises(ValueError):
+        cellx.eval_integer(expr)